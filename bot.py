@@ -2,17 +2,23 @@ import cProfile
 import argparse
 import collections
 import types
-import functools
 import pstats
 import random
 import logging
+import bisect
 import math
 import os
 import signal
 import sys
+import time
 
-from actions import get_actions
+from actions import find_route, get_actions, nearest_lambda
+import macros
+import polish
+import solutions
+import tour
 import util
+import world
 
 #MOVE_COMMANDS = ["U", "D", "L", "R", "A", "W"]
 
@@ -21,76 +27,6 @@ log = logging.getLogger(__name__)
 def manhattan_distance(origin, to):
     return abs(to[0] - origin[0]) + abs(to[1] - origin[1])
 
-def find_route(a_world, to, origin):
-    """Basic A* route finding, to/origin are (x,y) tuples
-       world is an instance of World.
-
-       http://en.wikipedia.org/wiki/A*_search_algorithm
-    """
-    _manhattan_distance = functools.partial(manhattan_distance, origin)
-
-    start = tuple(origin)
-    open_blocks = {start: (9999,9999,9999,None)}  # FGH
-    closed_blocks = {}
-    while True:
-        # Get min node:
-        current = None
-        f_max = 10000000
-        for k, v in open_blocks.iteritems():
-            if k in closed_blocks:
-                continue
-            if v[0] < f_max:
-                current = k
-                f_max = v[0]
-
-#       print "STEP", current, open_blocks.keys(), closed_blocks.keys()
-        if current is None:
-            # No route!
-            return None
-
-        # Move current to closed list
-        closed_blocks[current] = open_blocks[current]
-
-        # Use it:
-        scores = {world.EARTH: 4, world.LAMBDA: 0, world.EMPTY: 2, world.RAZOR: 3, world.BEARD: 1}
-        def _think(new, down=False):
-            try:
-                block = a_world.at(new[0], new[1])
-                if down and a_world.at(new[0], new[1]+2) == world.ROCK:
-                    # Down is not an option if there is a rock above us
-                    return
-            except IndexError:
-                # we tried to think of a position that was out-of-bounds
-                return
-            if block and block not in "#W*L123456789" and new not in closed_blocks:
-                g = scores.get(block, 5)
-                if new not in open_blocks or g < open_blocks[new][1]:
-                    h = _manhattan_distance(new)
-                    open_blocks[new] = (g + h, g, h, current)
-
-        _think((current[0], current[1]+1))  # Up
-        _think((current[0], current[1]-1), True)  # Down
-        _think((current[0]+1, current[1]))  # Left
-        _think((current[0]-1, current[1]))  # Right
-
-        if to in closed_blocks:
-            break  # Not guaranteed optimal to break on this
-
-    # Walk Backwards to get the actual route
-    cells = [to]
-    previous = closed_blocks[to][3]
-    while previous:
-        cells.insert(0, previous)
-        previous = closed_blocks[previous][3]
-
-    # Output the required robot commands
-    last_r = cells[0]
-    cmd_string = ""
-    for r in cells[1:]:
-        cmd_string += {(1,0):world.RIGHT, (-1,0): world.LEFT, (0,1): world.UP, (0,-1): world.DOWN}[(r[0]-last_r[0], r[1]-last_r[1])]
-        last_r = r
-    return cmd_string
-
 def get_robot(the_world):
     return the_world.robot
 
@@ -127,7 +63,7 @@ class NearBot(object):
         robot = get_robot(the_world)
 
         # Find the nearest lambdas
-        dist_lambdas = nearest_lambdas(the_world)[:self.num_nearby_lambdas]
+        dist_lambdas = nearest_lambdas(the_world, self.num_nearby_lambdas)
         if dist_lambdas:
             closest_distance = dist_lambdas[0][0]
             for dist, lambda_ in dist_lambdas:
@@ -137,7 +73,7 @@ class NearBot(object):
                 choices.append((cmdlist, float(closest_distance) / len(cmdlist)))
 
         # There are no lambdas, go to the lift
-        else:
+        elif not the_world.lambdas and the_world.lift_distance() is not None:
             target, d = nearest_lift(the_world)
             choices.append((find_route(the_world, target, robot), 10))
 
@@ -154,40 +90,81 @@ class Bot(object):
 
 class RandomBot(object):
     name = "random"
+    use_macros = True # walk one-wide corridors in one go
 
     def get_choices(self, a_world):
-        return [(c, a_world.move(c).goodness()) for c in a_world.valid_moves()]
+        choices = []
+        for c in a_world.useful_moves():
+            macro = None
+            if self.use_macros:
+                macro = macros.tunnel_macro(a_world, c)
+            if macro is not None:
+                choices.append((macro[0], macro[1].goodness()))
+            else:
+                choices.append((c, a_world.move(c).goodness()))
+        return choices
+
+class TourBot(object):
+    """Heads for the next stops of a lambda tour planned on the first world"""
+    name = "tour"
+    num_stops = 3 # the next stops of the tour to try
+
+    def __init__(self):
+        self.order = None
+
+    def get_choices(self, the_world):
+        robot = get_robot(the_world)
+        if self.order is None:
+            self.order = tour.plan(the_world).stops
+        choices = []
+        stops = [s for s in self.order if s in the_world.lambdas or s in the_world.razors]
+        for rank, stop in enumerate(stops[:self.num_stops]):
+            route = find_route(the_world, stop, robot)
+            if route:
+                choices.append((route, the_world.goodness(extra_moves=len(route)) / (rank + 1)))
+        if not the_world.lambdas and the_world.lift_distance() is not None:
+            route = find_route(the_world, the_world.lift, robot)
+            if route:
+                choices.append((route, 10 * the_world.goodness(extra_moves=len(route))))
+        if not choices:
+            choices.append((world.ABORT, 10))
+        return choices
 
 def point_distance(p0, p1):
     return math.sqrt((p0[0] - p1[0])**2 + (p0[1] - p1[1])**2)
 
-def nearest_lambdas(the_world):
-    """Find the nearest lambda, and the distance to it.
+def nearest_lambdas(the_world, limit=None):
+    """Find the lambdas the robot can walk to, nearest first.
 
     Returns:
-      (closest_lambda, distance)
-      closest_lambda -> (x, y) of the lambda
-      distance -> (x_distance, y_distance)
+      [(distance, (x, y))] for at most limit lambdas
+      distance -> the number of moves to walk there
     """
+    if the_world.lambda_distance() is None:
+        return []
+    # walking never beats the taxicab distance, except through a trampoline,
+    # so fields are only read for lambdas that can still make the cut
+    robot = the_world.robot
+    taxicab = lambda p, q: abs(p[0] - q[0]) + abs(p[1] - q[1])
+    def bound(pos):
+        d = taxicab(robot, pos)
+        for src, dst in the_world.trampolines.iteritems():
+            d = min(d, taxicab(robot, src) + taxicab(dst, pos))
+        return d
     lambdas = []
-    for x, y in the_world.lambdas:
-        lambdas.append((manhattan_distance(the_world.robot, (x, y)), (x, y)))
-    return sorted(lambdas)
+    for least, pos in sorted((bound(pos), pos) for pos in the_world.lambdas):
+        if limit is not None and len(lambdas) >= limit and least > lambdas[limit - 1][0]:
+            break
+        # one field per lambda, repaired along with the world
+        d = the_world.walking_distance(pos)
+        if d is not None:
+            bisect.insort(lambdas, (d, pos))
+    return lambdas[:limit]
 
 def nearest_lift(the_world):
+    assert not the_world.lambdas, 'cannot find open door when lambdas exist'
     robot = the_world.robot
-    lambdas = []
-    door = None
-    for (x, y) in the_world.positions():
-        cell = the_world.at(x, y)
-        if cell == 'O':
-            door = (x,y)
-        elif cell == '\\':
-            assert False, 'cannot find open door when lambdas exist'
-
-    assert door
-
-    distance = point_distance(door, robot)
+    door = the_world.lift
     return door, (door[0] - robot[0], door[1] - robot[1])
 
 class WeightedBot(Bot):
@@ -273,7 +250,7 @@ class Plan(object):
         if (robot[0] - 2) >= 0:
         # Same, pushing a rock left
             if (w.at(robot[0] - 1, robot[1]) == world.ROCK and
-                    the_world.at(robot[0]-2, robot[1]) == world.EMPTY):
+                    w.at(robot[0]-2, robot[1]) == world.EMPTY):
                 extra_worlds.append(w.move('L'))
         return extra_worlds
 
@@ -328,10 +305,14 @@ class Planner(object):
         raise override_me
 
 class FlatPlanner(Planner):
-    def __init__(self, bot, root_world):
+    def __init__(self, bot, root_world, seeds=()):
+        """seeds -- command strings to play out first, e.g. a lambda tour"""
         Planner.__init__(self, bot, root_world)
         self.plans = []
         self.root_world = root_world
+        for seed in seeds:
+            for w in Plan(root_world, seed).execute():
+                self.best.add(w, w.score())
         for path, weight in self.bot.get_choices(self.root_world):
             plan = Plan(root_world, path)
             self.add_plan(weight, plan)
@@ -339,6 +320,11 @@ class FlatPlanner(Planner):
     def add_plan(self, score, plan):
         self.plans.append((score, plan))
 
+    def commit(self, commands):
+        """Drop the plans that don't follow the committed commands"""
+        self.plans = [(score, plan) for score, plan in self.plans
+                      if str(plan.total_path).startswith(commands)]
+
     def pop_plan(self):
         n = sum(i[0] for i in self.plans)
         n *= random.random()
@@ -359,6 +345,9 @@ class FlatPlanner(Planner):
         if not p:
             return False
         score, plan = p
+        if plan.world.upper_bound() <= self.best.score:
+            # the best got better since this plan was added
+            return True
         worlds = plan.execute()
         for w in worlds:
             self.best.add(w, w.score())
@@ -366,6 +355,8 @@ class FlatPlanner(Planner):
                 continue
             if w.is_done():
                 continue
+            if w.upper_bound() <= self.best.score:
+                continue
             for path, weight in self.bot.get_choices(w):
                 new_plan = Plan(w, path)
                 self.add_plan(weight, new_plan)
@@ -416,16 +407,37 @@ class FlatPlanner(Planner):
 def finish_path(world):
     """Get the path of world and add 'A' if it's not done yet or failed"""
     if world.is_done():
-        return world.path
+        return str(world.path)
     elif not world.is_failed():
-        return world.path + 'A'
+        return str(world.path) + 'A'
+
+def polished_path(root_world, world, seconds):
+    """Get finish_path(world) with up to seconds spent polishing it, see polish.py"""
+    moves = finish_path(world)
+    if moves is None or seconds <= 0:
+        return moves
+    moves, points = polish.polish(root_world, moves, time.time() + seconds)
+    print >>sys.stderr, 'polishing won back %d points' % points
+    return moves
 
 def run_bot(bot, base_world, iterations,
         on_finish=None,
         initial_path=None,
         on_best=None,
         on_plan=None,
-        on_loop=None):
+        on_loop=None,
+        committer=None,
+        tour_seed=False,
+        solution_store=None,
+        deadline=None):
+    """Run the bot's planner against base_world, returning the best world.
+
+    committer -- a util.PrefixCommitter, once the start of the best path
+    settles the plans that leave it are dropped
+    tour_seed -- start from the path of a lambda tour, see tour.py
+    solution_store -- a solutions.SolutionStore to start from and keep new bests in
+    deadline -- a time.time() to stop at
+    """
 
     max_score = -1000
     max_moves = None
@@ -441,16 +453,30 @@ def run_bot(bot, base_world, iterations,
     else:
         looper = forever()
 
+    map_world = base_world
+    seeds = []
+    if solution_store is not None and not initial_path:
+        cached = solution_store.get(base_world)
+        if cached is not None:
+            seeds.append(cached[1])
     if initial_path:
         for p in initial_path:
             try:
                 base_world = base_world.move(p)
             except world.InvalidMove:
                 break
-    planner = FlatPlanner(bot, base_world)
+    if tour_seed:
+        seeds.append(tour.follow(base_world, tour.plan(base_world).stops))
+    planner = FlatPlanner(bot, base_world, seeds)
+    bound = base_world.upper_bound()
     for _ in looper:
         if on_loop is not None:
             on_loop(planner)
+        if committer is not None:
+            commands = committer.ready()
+            if commands is not None:
+                planner.commit(commands)
+                committer.accept(commands)
         more_plans = planner.iterate()
         a_world = planner.best.key
         if a_world is None:
@@ -462,10 +488,16 @@ def run_bot(bot, base_world, iterations,
             max_world = a_world
             max_score = score
             max_moves = finish_path(a_world)
+            if committer is not None:
+                committer.update(a_world.path)
+            if solution_store is not None:
+                solution_store.put(map_world, str(a_world.path), score)
             if a_world.is_done():
                 if on_finish:
                     on_finish(a_world, score, max_moves)
-        if not more_plans:
+        if not more_plans or max_score >= bound:
+            break
+        if deadline is not None and time.time() > deadline:
             break
     print >>sys.stderr, ''
     print >>sys.stderr, 'Ran out of iterations!'
@@ -473,6 +505,7 @@ def run_bot(bot, base_world, iterations,
     w = planner.best.key
     if on_finish:
         on_finish(w, w.score(), finish_path(w))
+    return w
 
 def bot_for_name(name):
     for cls in globals().values():
@@ -482,7 +515,6 @@ def bot_for_name(name):
         raise AttributeError(name)
 
 if __name__ == "__main__":
-    import world
     opt_parser = argparse.ArgumentParser()
     #opt_parser.add_argument('--verbose', '-v', dest='verbosity', default=0, action='count')
     opt_parser.add_argument('--iterations', '-i', dest='iterations', default=None, type=int)
@@ -490,6 +522,16 @@ if __name__ == "__main__":
     opt_parser.add_argument('--time-based', default=0, type=int, help='max seconds to run')
     opt_parser.add_argument('--initial-path', default='')
     opt_parser.add_argument('--profile', default=False, action='store_true')
+    opt_parser.add_argument('--no-tour', dest='tour', default=True, action='store_false',
+                            help="don't start from the path of a lambda tour")
+    opt_parser.add_argument('--solutions', default=solutions.DEFAULT_DIRECTORY,
+                            help='directory of best known solutions to start from and add to, empty for none')
+    opt_parser.add_argument('--commit-step', default=0, type=int,
+                            help='commit the best path this many moves at a time and drop the other plans, 0 to never commit')
+    opt_parser.add_argument('--commit-hold', default=5.0, type=float,
+                            help='seconds the next moves of the best path must stay unchanged before they are committed')
+    opt_parser.add_argument('--polish', default=1.0, type=float,
+                            help='seconds of the time budget kept for polishing the best path, 0 to not polish')
 
     opt_parser.add_argument('file')
     args = opt_parser.parse_args()
@@ -500,6 +542,12 @@ if __name__ == "__main__":
 
     the_bot = bot_for_name(args.name)
     the_world = world.read_world(args.file)
+    committer = None
+    if args.commit_step:
+        committer = util.PrefixCommitter(args.commit_step, args.commit_hold)
+    solution_store = None
+    if args.solutions:
+        solution_store = solutions.SolutionStore(args.solutions)
 
     def on_finish(world, score, moves):
         print >>sys.stderr, "Moves: %s" % "".join(moves)
@@ -509,6 +557,7 @@ if __name__ == "__main__":
 
     class ascope:
         best = the_world
+        finishing = False
 
     def on_best(planner, world):
         global best
@@ -523,11 +572,16 @@ if __name__ == "__main__":
         print >>sys.stderr, ('exploring path %r + %r....' % (plan.world.path, plan.path))
 
     def return_best(*signal_args_i_dont_care_about):
+        if ascope.finishing:
+            # interrupted while polishing
+            print finish_path(ascope.best)
+            os._exit(0)
+        ascope.finishing = True
         print >>sys.stderr, "best world: ", ascope.best.score()
         print >>sys.stderr
         print >>sys.stderr, ascope.best
 
-        print finish_path(ascope.best)
+        print polished_path(the_world, ascope.best, args.polish)
         os._exit(0)
 
     signal.signal(signal.SIGINT, return_best)
@@ -544,17 +598,22 @@ if __name__ == "__main__":
         stats.print_stats()
         os.unlink(profile_path)
     elif args.time_based > 0:
-        signal.alarm(args.time_based)
+        signal.setitimer(signal.ITIMER_REAL, max(0.1, args.time_based - args.polish))
         def on_finish(world, score, moves):
             #print ''.join(moves)
             #sys.exit(0)
             pass
-        run_bot(the_bot, the_world, -1, on_best=on_best)
-        print finish_path(ascope.best)
+        run_bot(the_bot, the_world, -1, on_best=on_best, committer=committer, tour_seed=args.tour,
+                initial_path=args.initial_path.rstrip('A'), solution_store=solution_store)
+        ascope.finishing = True
+        print polished_path(the_world, ascope.best, args.polish)
     else:
         run_bot(the_bot, the_world, args.iterations,
                 on_finish=on_finish,
                 on_plan=on_plan,
                 on_best=on_best,
                 on_loop=on_loop,
-                initial_path=args.initial_path.rstrip('A'))
+                initial_path=args.initial_path.rstrip('A'),
+                committer=committer,
+                tour_seed=args.tour,
+                solution_store=solution_store)
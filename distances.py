@@ -0,0 +1,411 @@
+"""Walking distances for heuristics and score bounds.
+
+StaticDistances bounds what a world can still score.  Walls never move, so
+a breadth first search over every cell that isn't a wall, where stepping
+next to a trampoline may also land on its target, never overestimates the
+moves the robot needs to get somewhere.  Rocks, earth, beards and used up
+trampolines only make real paths longer.  Its fields are shared by every
+World copied from the same map.
+
+WalkingDistances holds true walking distances for one World, to the lift,
+to the nearest lambda and to single cells.  They aren't admissible (a rock
+in the way may be pushed or fall away) but they are what the robot would
+walk right now, and they are repaired incrementally as the map changes.
+"""
+import array
+import copy
+import heapq
+
+import util
+import world
+
+UNREACHABLE = -1
+
+class StaticDistances(object):
+    """Lower bounds on the moves between any two cells of a map
+
+    Also knows which rocks can never move again.  A rock with a wall or the
+    lift below it and on one side can't fall, slide or be pushed (the dead
+    squares of Sokoban), and rocks resting on frozen rocks may be frozen
+    in turn.  blocked_by() gives distances with frozen rocks as walls.
+
+    Instance Variables:
+    width -- the map width
+    passable -- bytearray indexed by y*width + x, 1 where the robot may ever stand
+    solid -- bytearray indexed like passable, 1 for walls and the lift
+    dead_squares -- set of cell indexes where a rock is frozen on its own
+    fields -- maps a goal cell index to an array of distances to it
+    """
+
+    def __init__(self, w):
+        width, height = w.size()
+        self.width = width
+        self.height = height
+        self.passable = bytearray(width * height)
+        self.solid = bytearray(width * height)
+        for x, y in w.positions():
+            c = w.map[y][x]
+            if c != world.WALL:
+                self.passable[y * width + x] = 1
+            if c in (world.WALL, world.CLOSED, world.OPEN):
+                self.solid[y * width + x] = 1
+        self.dead_squares = set()
+        for x, y in w.positions():
+            if self.passable[y * width + x] and self.is_solid(x, y - 1) and \
+                    (self.is_solid(x - 1, y) or self.is_solid(x + 1, y)):
+                self.dead_squares.add(y * width + x)
+        self.variants = util.LRUCache(16)
+        # trampolines only get used up, so the ones a map starts with cover
+        # every world copied from it
+        self.sources = {} # maps a target cell to the trampoline cells leading there
+        for (x, y), (tx, ty) in w.trampolines.iteritems():
+            self.sources.setdefault(ty * width + tx, []).append(y * width + x)
+        self.fields = {}
+
+    def neighbors(self, i):
+        width = self.width
+        x = i % width
+        if x > 0:
+            yield i - 1
+        if x < width - 1:
+            yield i + 1
+        if i >= width:
+            yield i - width
+        if i + width < len(self.passable):
+            yield i + width
+
+    def field(self, pos):
+        """Get the distances from every cell to pos, UNREACHABLE where there is no way"""
+        x, y = pos
+        goal = y * self.width + x
+        dist = self.fields.get(goal)
+        if dist is not None:
+            return dist
+        passable = self.passable
+        dist = array.array('i', [UNREACHABLE]) * len(passable)
+        dist[goal] = 0
+        frontier = [goal]
+        while frontier:
+            next_frontier = []
+            for v in frontier:
+                d = dist[v] + 1
+                # the robot gets to v by stepping on it, or onto a trampoline to it
+                entries = [v]
+                entries.extend(self.sources.get(v, ()))
+                for e in entries:
+                    for u in self.neighbors(e):
+                        if passable[u] and dist[u] == UNREACHABLE:
+                            dist[u] = d
+                            next_frontier.append(u)
+            frontier = next_frontier
+        self.fields[goal] = dist
+        return dist
+
+    def distance(self, src, dst):
+        """Get a lower bound on the moves from src to dst, or UNREACHABLE"""
+        x, y = src
+        return self.field(dst)[y * self.width + x]
+
+    def is_solid(self, x, y, frozen=()):
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return True
+        return self.solid[y * self.width + x] or (x, y) in frozen
+
+    def frozen(self, w, known=()):
+        """Get the rocks of w that can never move again, as a frozenset.
+
+        known -- rocks already known to be frozen, e.g. in an earlier world
+        """
+        frozen = set(known)
+        width = self.width
+        changed = True
+        while changed:
+            changed = False
+            for x, y in w.rocks:
+                if (x, y) in frozen:
+                    continue
+                if y * width + x in self.dead_squares:
+                    stuck = True
+                elif (x, y - 1) in frozen:
+                    # resting on a frozen rock, it may still slide off either side
+                    left = self.is_solid(x - 1, y, frozen)
+                    right = self.is_solid(x + 1, y, frozen)
+                    stuck = ((left or right) and
+                             (right or self.is_solid(x + 1, y - 1, frozen)) and
+                             (left or self.is_solid(x - 1, y - 1, frozen)))
+                else:
+                    stuck = (self.is_solid(x, y - 1, frozen) and
+                             (self.is_solid(x - 1, y, frozen) or self.is_solid(x + 1, y, frozen)))
+                if stuck:
+                    frozen.add((x, y))
+                    changed = True
+        return frozenset(frozen)
+
+    def blocked_by(self, cells):
+        """Get the distances for this map with the (x, y) cells walled up too"""
+        if not cells:
+            return self
+        variant = self.variants.get(cells)
+        if variant is None:
+            variant = copy.copy(self)
+            variant.passable = bytearray(self.passable)
+            for x, y in cells:
+                variant.passable[y * self.width + x] = 0
+            variant.fields = {}
+            variant.variants = None
+            self.variants.put(cells, variant)
+        return variant
+
+INFINITY = 1 << 30
+
+# cells the robot can step onto and stand on.  The lift is only ever a goal,
+# walking into it ends the game.
+_WALKABLE = frozenset([world.EMPTY, world.EARTH, world.LAMBDA, world.ROBOT, world.RAZOR])
+_STANDABLE = _WALKABLE | frozenset(world.TARGETS)
+
+def _neighbors(i, width, size):
+    x = i % width
+    if x > 0:
+        yield i - 1
+    if x < width - 1:
+        yield i + 1
+    if i >= width:
+        yield i - width
+    if i + width < size:
+        yield i + width
+
+def _successors(w, u, width, size, goals):
+    """Get the cells the robot at u may end up on after one step"""
+    m = w.map
+    for v in _neighbors(u, width, size):
+        pos = (v % width, v // width)
+        if pos in w.trampolines:
+            tx, ty = w.trampolines[pos]
+            yield ty * width + tx
+        elif m[pos[1]][pos[0]] in _WALKABLE or v in goals:
+            yield v
+
+class DistanceField(object):
+    """Walking distances from every cell to the nearest of a set of goals
+
+    Rocks, beards and walls block the robot, trampolines take it to their
+    targets.  Cells the robot can't stand on or can't get from are at
+    INFINITY.
+
+    Instance Variables:
+    goals -- frozenset of goal cell indexes
+    dist -- array of distances indexed by y*width + x
+    """
+
+    def __init__(self, w, goals, dist=None):
+        self.width, self.height = w.size()
+        self.goals = frozenset(goals)
+        if dist is None:
+            dist = self._compute(w)
+        self.dist = dist
+
+    def distance(self, pos):
+        x, y = pos
+        d = self.dist[y * self.width + x]
+        if d >= INFINITY:
+            return None
+        return d
+
+    def successors(self, w, u):
+        return _successors(w, u, self.width, self.width * self.height, self.goals)
+
+    def predecessors(self, w, v, sources):
+        """Get the cells the robot may stand on to reach v in one step"""
+        width = self.width
+        size = width * self.height
+        m = w.map
+        x = v % width
+        y = v // width
+        entries = list(sources.get(v, ()))
+        if (x, y) not in w.trampolines and (m[y][x] in _WALKABLE or v in self.goals):
+            entries.append(v)
+        for e in entries:
+            for u in _neighbors(e, width, size):
+                if m[u // width][u % width] in _STANDABLE:
+                    yield u
+
+    def _compute(self, w):
+        sources = _trampoline_sources(w)
+        dist = array.array('i', [INFINITY]) * (self.width * self.height)
+        frontier = list(self.goals)
+        for g in frontier:
+            dist[g] = 0
+        while frontier:
+            next_frontier = []
+            for v in frontier:
+                d = dist[v] + 1
+                for u in self.predecessors(w, v, sources):
+                    if dist[u] == INFINITY:
+                        dist[u] = d
+                        next_frontier.append(u)
+            frontier = next_frontier
+        return dist
+
+    def repaired(self, w, changed, goals):
+        """Get the field for w, whose map differs from ours in the changed cells.
+
+        Cells whose shortest way went through a changed cell lose their
+        distance and are recomputed from their neighbors, then the
+        decreases spread out again.  Everything else is kept.
+        """
+        goals = frozenset(goals)
+        old = self.dist
+        new = DistanceField(w, goals, dist=array.array('i', old))
+        dist = new.dist
+        sources = _trampoline_sources(w)
+        width = self.width
+        size = width * self.height
+
+        # find the cells that no longer have a neighbor one step closer
+        invalid = set(changed)
+        queue = list(changed)
+        while queue:
+            x = queue.pop()
+            dx = old[x]
+            if dx >= INFINITY:
+                continue
+            candidates = list(_neighbors(x, width, size))
+            for s in sources.get(x, ()):
+                candidates.extend(_neighbors(s, width, size))
+            for u in candidates:
+                if u in invalid or u in goals or old[u] != dx + 1:
+                    continue
+                if any(v not in invalid and dist[v] == dx for v in new.successors(w, u)):
+                    continue
+                invalid.add(u)
+                queue.append(u)
+        for u in invalid:
+            dist[u] = INFINITY
+
+        # recompute them from their neighbors, then spread the decreases
+        heap = []
+        m = w.map
+        for u in invalid:
+            if u in goals:
+                d = 0
+            elif m[u // width][u % width] in _STANDABLE:
+                d = min([dist[v] for v in new.successors(w, u)] or [INFINITY]) + 1
+            else:
+                continue
+            if d < dist[u]:
+                dist[u] = d
+                heap.append((d, u))
+        heapq.heapify(heap)
+        while heap:
+            d, x = heapq.heappop(heap)
+            if d != dist[x]:
+                continue
+            for u in new.predecessors(w, x, sources):
+                if d + 1 < dist[u]:
+                    dist[u] = d + 1
+                    heapq.heappush(heap, (d + 1, u))
+        return new
+
+def _trampoline_sources(w):
+    width = w.width()
+    sources = {}
+    for (x, y), (tx, ty) in w.trampolines.iteritems():
+        sources.setdefault(ty * width + tx, []).append(y * width + x)
+    return sources
+
+class WalkingDistances(object):
+    """The walking distance fields of a World, to the lift, to the nearest
+    lambda and to single cells.
+
+    Fields are computed when first asked for.  A World copied without
+    changing any cell the fields depend on shares them.  Otherwise the copy
+    keeps them as stale, with the cells changed since, and repairs each one
+    when it is asked for, so fields nobody looks at cost nothing per move.
+    """
+
+    def __init__(self, trampolines, fields=None, stale=None):
+        self.trampolines = trampolines # the trampolines the fields were made for
+        self.fields = fields or {}
+        self.stale = stale or {} # name -> (field of an earlier world, cells changed since)
+
+    def goals(self, w, name):
+        width = w.width()
+        if name == 'lift':
+            positions = [w.lift]
+        elif name == 'lambdas':
+            positions = w.lambdas
+        else:
+            positions = [name] # the (x, y) of one cell
+        return [y * width + x for x, y in positions]
+
+    def field(self, w, name):
+        f = self.fields.get(name)
+        if f is None:
+            if name in self.stale:
+                old, changed = self.stale.pop(name)
+                f = old.repaired(w, changed, self.goals(w, name))
+            else:
+                f = DistanceField(w, self.goals(w, name))
+            self.fields[name] = f
+        return f
+
+    def after_move(self, before, after):
+        """Get the fields for after, a world one move away from before"""
+        candidates = set([before.robot, after.robot])
+        candidates.update(set(before.rocks).symmetric_difference(after.rocks))
+        if after.beards is not before.beards:
+            candidates.update(before.beards.symmetric_difference(after.beards))
+        width = after.width()
+        size = width * after.height()
+        changed = set()
+        if after.trampolines is not self.trampolines:
+            # a used up trampoline is an empty cell now, so it and the cells
+            # next to it step somewhere else, and its target can be walked on
+            for (x, y), (tx, ty) in self.trampolines.iteritems():
+                if (x, y) not in after.trampolines:
+                    changed.add(y * width + x)
+                    changed.update(_neighbors(y * width + x, width, size))
+                    changed.add(ty * width + tx)
+        for x, y in candidates:
+            a = before.map[y][x]
+            b = after.map[y][x]
+            if (a in _STANDABLE) != (b in _STANDABLE) or (a == world.LAMBDA) != (b == world.LAMBDA):
+                changed.add(y * width + x)
+        if not changed:
+            return self
+        changed = frozenset(changed)
+        stale = {}
+        for name, (f, earlier) in self.stale.iteritems():
+            stale[name] = (f, earlier | changed)
+        for name, f in self.fields.iteritems():
+            stale[name] = (f, changed)
+        for name in stale.keys():
+            if isinstance(name, tuple) and name[1] * width + name[0] in changed:
+                del stale[name] # mostly lambdas picked up, made again if asked for
+        return WalkingDistances(after.trampolines, stale=stale)
+
+def walk(w, start=None):
+    """Breadth first walk from start (the robot by default).
+
+    Generates (distance, (x, y)) for every cell the robot can get to.
+    """
+    if start is None:
+        start = w.robot
+    width, height = w.size()
+    size = width * height
+    no_goals = frozenset()
+    x, y = start
+    i = y * width + x
+    seen = set([i])
+    frontier = [i]
+    d = 0
+    while frontier:
+        next_frontier = []
+        for u in frontier:
+            yield d, (u % width, u // width)
+            for v in _successors(w, u, width, size, no_goals):
+                if v not in seen:
+                    seen.add(v)
+                    next_frontier.append(v)
+        frontier = next_frontier
+        d += 1
@@ -0,0 +1,95 @@
+"""When the water gets where.
+
+The water rises once every `flooding` moves, so its level is a closed form
+of the move count and the whole flood is known from the start.  A robot
+moves at most one row per move, so it can only be alive in a cell at a
+given move if it was above the water somewhere close enough within the last
+`waterproof` moves.  FloodTimeline works out, for every row, the last move
+count at which the robot can arrive there alive.  Trampolines can take the
+robot anywhere, so on maps with trampolines no row ever has a deadline.
+"""
+INFINITY = 1 << 30
+
+class FloodTimeline(object):
+    """The water level and the survival deadline of every row
+
+    Built from the first world of a map and shared by every world copied
+    from it.  Deadlines count moves from that first world on and don't
+    look at the robot, so they hold for any of them.
+
+    Instance Variables:
+    start -- the move count of the world the timeline was made from
+    deadlines -- the last move count the robot can arrive in each row alive
+    """
+
+    def __init__(self, w):
+        self.water = w.water
+        self.flooding = w.flooding
+        self.waterproof = w.waterproof
+        self.start = w.num_moves
+        self.height = w.height()
+        self.jumps = bool(w.trampolines)
+        self.deadlines = [self._deadline(y) for y in xrange(self.height)]
+
+    def _rises(self, num_moves):
+        """How often the water has risen from the first move to num_moves moves"""
+        if num_moves < 1:
+            return 0
+        return (num_moves - 1) // self.flooding
+
+    def level(self, num_moves):
+        """Get the water level once num_moves moves have been made"""
+        if self.flooding <= 0:
+            return self.water
+        return self.water + self._rises(num_moves) - self._rises(self.start)
+
+    def _last_below(self, level):
+        """Get the last move count with the water below level, or None if it already isn't"""
+        if self.water >= level:
+            return None
+        if self.flooding <= 0:
+            return INFINITY
+        rises = level - 1 - self.water + self._rises(self.start)
+        return (rises + 1) * self.flooding
+
+    def _deadline(self, y):
+        # the robot arriving in row y at move t checks the water of move
+        # t - 1.  It's alive if it was above the water c <= waterproof
+        # moves before, at most c rows higher, or before the start
+        if self.jumps:
+            return INFINITY
+        best = self.start + self.waterproof
+        for c in xrange(self.waterproof + 1):
+            n = self._last_below(y + c)
+            if n == INFINITY:
+                return INFINITY
+            if n is not None:
+                best = max(best, n + c + 1)
+        return best
+
+    def doom(self, w):
+        """Get the last move count the robot of w can be alive at.
+
+        None if it may still get out of the water in time.
+        """
+        if self.jumps or w.underwater == 0:
+            return None
+        y = w.robot[1]
+        m = w.num_moves
+        for s in xrange(m + 1, m + self.waterproof - w.underwater + 2):
+            if y + (s - m) > self.level(s - 1):
+                return None
+        return m + self.waterproof - w.underwater
+
+    def survivable(self, pos, num_moves, doom=None):
+        """Check whether the robot may arrive at pos after num_moves moves and live"""
+        if doom is not None and num_moves > doom:
+            return False
+        return num_moves <= self.deadlines[pos[1]]
+
+    def reachable(self, pos, num_moves, doom=None):
+        """Check whether the robot may arrive at pos after num_moves moves, even drowning there"""
+        if doom is not None and num_moves > doom + 1:
+            return False
+        above = self.deadlines[min(pos[1] + 1, self.height - 1)]
+        return num_moves <= max(above, self.deadlines[pos[1]]) + 1
@@ -0,0 +1,287 @@
+"""A population of move strings, bred for score.
+
+Each individual is the commands of a whole game.  A child takes the start
+of one parent up to one of its lambda pickups and the rest of another
+parent from one of its pickups on, with a nav route walking the robot
+between the two, and is then mutated: a command swapped for, or preceded
+by, another useful move, a command deleted, or a detour to a lambda
+inserted.  Children are scored by playing them with a Rollout, skipping
+commands that are invalid by then and aborting if the game doesn't end,
+and the commands actually played become the child.
+
+Breeding and scoring a generation is farmed out to a pool of processes,
+each with its own ReplayCache for the worlds it needs along the parents.
+"""
+import multiprocessing
+import optparse
+import random
+import signal
+import time
+
+import nav
+import polish
+import replay
+import rollout
+import solutions
+import tour
+import world
+
+# per process, set up by _init()
+_root = None
+_cache = None
+_rollout = None
+_max_depth = 100
+
+def _init(initial_world, max_depth, ignore_interrupts=False):
+    global _root, _cache, _rollout, _max_depth
+    if ignore_interrupts:
+        # the parent handles ^C for the pool
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        random.seed() # forked workers all start with the parent's random state
+    _root = initial_world
+    _cache = replay.ReplayCache(initial_world)
+    _rollout = rollout.Rollout(max_depth)
+    _max_depth = max_depth
+
+def evaluate(commands):
+    """Play commands on the root world.
+
+    Returns (score, played, pickups) where played are the commands that
+    were valid, ending the game, and pickups has (length, cell) for each
+    lambda picked up, after played[:length] with the robot on cell.
+    """
+    r = _rollout
+    r.reset(_root)
+    moves = r.moves
+    width = r.width
+    pickups = []
+    for cmd in commands:
+        if r.state != world.RUNNING:
+            break
+        n = r.valid_moves()
+        if cmd not in moves[:n]:
+            continue
+        collected = r.lambdas_collected
+        r.step(cmd)
+        if r.lambdas_collected != collected:
+            pickups.append((r.length, (r.robot % width, r.robot // width)))
+    if r.state == world.RUNNING:
+        r.step(world.ABORT)
+    return r.score(), r.commands(), pickups
+
+def _body(commands):
+    return commands[:-1] if commands.endswith(world.ABORT) else commands
+
+def crossover(a, b):
+    """Get the start of a up to a pickup, then the rest of b from a pickup"""
+    _, a_commands, a_pickups = a
+    _, b_commands, b_pickups = b
+    i = random.choice([0] + [k for k, _ in a_pickups])
+    j, cell = random.choice([(0, _root.robot)] + b_pickups)
+    prefix = a_commands[:i]
+    w = _cache.world(prefix)
+    if w is None or w.is_done():
+        return _body(a_commands)
+    leg = nav.route(w, cell)
+    if leg is None:
+        leg = ''
+    return prefix + leg + _body(b_commands[j:])
+
+def mutate(commands):
+    i = random.randrange(len(commands) + 1)
+    w = _cache.world(commands[:i])
+    if w is None or w.is_done():
+        return commands
+    kind = random.random()
+    if kind < 0.2:
+        goals = list(w.lambdas) or [w.lift]
+        leg = nav.route(w, random.choice(goals))
+        if leg:
+            return commands[:i] + leg + commands[i:]
+        return commands
+    if kind < 0.4 and i < len(commands):
+        return commands[:i] + commands[i + 1:]
+    moves = w.useful_moves().replace(world.ABORT, '')
+    if not moves:
+        return commands
+    cmd = random.choice(moves)
+    if kind < 0.7:
+        return commands[:i] + cmd + commands[i:]
+    return commands[:i] + cmd + commands[i + 1:]
+
+def breed(parents):
+    """Get a scored child of parents, or a random playout if there are none"""
+    if parents is None:
+        r = _rollout
+        r.reset(_root)
+        r.play(_max_depth)
+        return evaluate(r.commands())
+    a, b, crossover_rate = parents
+    if b is not None and random.random() < crossover_rate:
+        child = crossover(a, b)
+    else:
+        child = _body(a[1])
+    child = mutate(child)
+    while random.random() < 0.3:
+        child = mutate(child)
+    return evaluate(child)
+
+def _tournament(population, size):
+    return max(random.sample(population, min(size, len(population))))
+
+class Evolution(object):
+    """The population and how to make the next one
+
+    Instance Variables:
+    population -- (score, commands, pickups) of each individual, best first
+    best_score, best_commands -- the best game played so far
+    generation -- how many generations were bred
+    """
+
+    def __init__(self, mapper=map, population=60, children=60, crossover=0.6, tournament=3):
+        """mapper -- a map() to breed children with, maybe a pool's"""
+        self.size = population
+        self.children = children
+        self.crossover_rate = crossover
+        self.tournament = tournament
+        self.mapper = mapper
+        self.population = []
+        self.best_score = None
+        self.best_commands = None
+        self.generation = 0
+
+    def _select(self, children):
+        """Keep the best distinct individuals of the population and children.
+
+        Returns True if the best is new.
+        """
+        seen = set()
+        population = []
+        for individual in sorted(self.population + children, reverse=True):
+            if individual[1] not in seen:
+                seen.add(individual[1])
+                population.append(individual)
+        self.population = population[:self.size]
+        score, commands, _ = self.population[0]
+        if self.best_score is None or score > self.best_score:
+            self.best_score = score
+            self.best_commands = commands
+            return True
+        return False
+
+    def start(self, seeds):
+        """Make the first population from seeds and random playouts"""
+        children = self.mapper(breed, [None] * max(0, self.size - len(seeds)))
+        return self._select([evaluate(s) for s in seeds] + children)
+
+    def step(self):
+        """Breed the next generation, returning True if the best is new"""
+        population = self.population
+        tasks = []
+        for _ in xrange(self.children):
+            a = _tournament(population, self.tournament)
+            b = _tournament(population, self.tournament)
+            tasks.append((a, b, self.crossover_rate))
+        self.generation += 1
+        return self._select(self.mapper(breed, tasks))
+
+def _report(initial_world, search, solution_store):
+    """Print the best of search and store it, returning its commands"""
+    print 'NEWBEST'
+    print 'current best %s %s' % (search.best_score, search.best_commands)
+    if solution_store is not None:
+        solution_store.put(initial_world, search.best_commands, search.best_score)
+    return search.best_commands
+
+def evolve(initial_world, seeds, opts, solution_store=None):
+    """Breed from seeds until opts.time is up or ^C, then print the best path"""
+    _init(initial_world, opts.max_depth)
+    pool = None
+    mapper = map
+    if opts.workers > 1:
+        pool = multiprocessing.Pool(opts.workers, _init, (initial_world, opts.max_depth, True))
+        def mapper(func, tasks):
+            chunk = max(1, len(tasks) // (4 * opts.workers))
+            # a timeout keeps the wait interruptible
+            return pool.map_async(func, tasks, chunk).get(1 << 20)
+
+    deadline = None
+    if opts.time > 0:
+        deadline = time.time() + max(0.0, opts.time - opts.polish)
+    search = Evolution(mapper, opts.population, opts.children, opts.crossover, opts.tournament)
+    reported = None
+    try:
+        search.start(seeds)
+        while True:
+            if search.best_commands != reported:
+                reported = _report(initial_world, search, solution_store)
+            if deadline is not None and time.time() >= deadline:
+                break
+            if search.generation % 10 == 0:
+                print 'generation %d, current best %s %s' % (search.generation, search.best_score, search.best_commands)
+            search.step()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pool is not None:
+            pool.terminate()
+    if search.best_commands is not None and search.best_commands != reported:
+        # found by the generation that was interrupted
+        _report(initial_world, search, solution_store)
+
+    commands = search.best_commands
+    if not commands:
+        commands = world.ABORT
+    elif opts.polish > 0:
+        commands, points = polish.polish(initial_world, commands, time.time() + opts.polish)
+        print 'polishing won back %d points' % points
+    print commands
+
+def main(opts):
+    initial_world = world.read_world([])
+    print initial_world
+
+    solution_store = None
+    seeds = [tour.follow(initial_world, tour.plan(initial_world).stops)]
+    if opts.initial_path:
+        seeds.append(opts.initial_path)
+    if opts.solutions:
+        solution_store = solutions.SolutionStore(opts.solutions)
+        cached = solution_store.get(initial_world)
+        if cached is not None:
+            print 'cached score %d for [%s]' % cached
+            if cached[0] >= initial_world.upper_bound():
+                # nothing can do better
+                print cached[1]
+                return
+            if not opts.initial_path:
+                seeds.append(cached[1])
+    evolve(initial_world, seeds, opts, solution_store)
+
+def option_parser():
+    parser = optparse.OptionParser()
+    parser.add_option('--time', default=0, type='float',
+                      help='seconds to search before printing the best path, 0 to run until interrupted')
+    parser.add_option('--population', default=60, type='int',
+                      help='individuals in each generation')
+    parser.add_option('--children', default=60, type='int',
+                      help='children bred in each generation, to compete with the population')
+    parser.add_option('--crossover', default=0.6, type='float',
+                      help='chance that a child has two parents')
+    parser.add_option('--tournament', default=3, type='int',
+                      help='individuals drawn to pick each parent from')
+    parser.add_option('--max-depth', default=100, type='int',
+                      help='moves of the random playouts in the first generation')
+    parser.add_option('--workers', default=1, type='int',
+                      help='number of processes breeding and scoring children')
+    parser.add_option('--initial-path', default='',
+                      help='commands to put in the first generation, instead of the cached solution')
+    parser.add_option('--solutions', default=solutions.DEFAULT_DIRECTORY,
+                      help='directory of best known solutions to start from and add to, empty for none')
+    parser.add_option('--polish', default=1.0, type='float',
+                      help='seconds of the time budget kept for polishing the best path, 0 to not polish')
+    return parser
+
+if __name__ == "__main__":
+    opts, args = option_parser().parse_args()
+    main(opts)
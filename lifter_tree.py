@@ -5,187 +5,259 @@ import world
 import random
 import math
 import optparse
-from heapq import *
+import util
+import macros
+import nodepool
+import solutions
+from nodepool import NO_NODE, PRUNED
 
 def world_to_map_str(w):
     return ''.join(''.join(row) for row in w.map)
 
-class Node(object):
-    def __init__(self, parent_node, w, command_history):
-        self.parent_node = parent_node
-        self.world = w
-        self.command_history = command_history
-        self.unexplored_commands = list(self.world.valid_moves())
-        if 'A' in self.unexplored_commands:
-            self.unexplored_commands.remove('A') # safe optimization
-        #print 'unexplored_commands', self.unexplored_commands
-        self.child_nodes = {} # map from command character to node
-        self.score = self.world.score()
-        self.max_child_score = self.score
-        self.dominated = False
-
-    def pprint(self, indent=0, depth_left=-1):
-        print '%s[%s] %d %d %s' % (' '*indent, self.command_history, self.score, self.max_child_score, 'DONE' if self.world.is_done() else '')
-        if depth_left == 0:
-            return
-        for cmd, child in self.child_nodes.items():
-            if child:
-                child.pprint(indent+2, depth_left-1)
-            else:
-                print '%s[%s] None' % (' '*(indent+2), self.command_history+cmd)
-
 node_count = 0
 best_score = 0
 best_commands = ''
+committed = '' # commands before the current root, in commit mode
 
-def main():
+def main(opts):
+    global best_score, best_commands
     initial_world = world.read_world([])
 
-    explorable_nodes = []
-    explore_heapq = []
-    map_to_node = {} # key is stringified map, value is node
+    memory_budget = None
+    if opts.memory_budget:
+        memory_budget = opts.memory_budget * 1024 * 1024
+    pool = nodepool.NodePool()
+    store = nodepool.WorldStore(pool,
+                                interval=opts.checkpoint_interval,
+                                memory_budget=memory_budget,
+                                max_slowdown=opts.max_slowdown,
+                                world_bytes=nodepool.estimate_world_bytes(initial_world))
+
+    # every node that is not done and still has unexplored commands is in
+    # both of these, except dominated nodes we have not noticed yet
+    explorable_nodes = util.RandomSet()
+    explore_heap = util.IndexedHeap()
+    map_to_node = {} # key is stringified map, value is node id
+
+    committer = None
+    if opts.commit_step:
+        committer = util.PrefixCommitter(opts.commit_step, opts.commit_hold)
+    solution_store = None
+    if opts.solutions:
+        solution_store = solutions.SolutionStore(opts.solutions)
 
     debug_mode = False
     def debug(s):
         if debug_mode:
             print s
 
-    def add_node(parent, w, map_str, command_history):
+    def add_node(parent, w, map_str, command):
         global node_count, best_score, best_commands
 
-        n = Node(parent, w, command_history)
-        if best_score is None or n.score > best_score:
+        commands = w.useful_moves().replace('A', '') # safe optimization
+        n = pool.add(parent, command, w, commands)
+        score = pool.score[n]
+        if best_score is None or score > best_score:
             print 'NEWBEST'
-            best_score = n.score
-            best_commands = n.command_history
+            best_score = score
+            best_commands = committed + pool.path(n)
+            if committer is not None:
+                committer.update(best_commands)
+            if solution_store is not None:
+                solution_store.put(initial_world, best_commands, best_score)
         map_to_node[map_str] = n
         node_count += 1
-        if not w.is_done():
-            explorable_nodes.append(n)
-            heappush(explore_heapq, (-n.score, n))
+        if not w.is_done() and pool.has_unexplored(n):
+            explorable_nodes.add(n)
+            explore_heap.push(n, score)
         return n
 
-    root = add_node(None, initial_world, world_to_map_str(initial_world), '')
+    def drop_node(n):
+        explorable_nodes.discard(n)
+        explore_heap.discard(n)
+
+    def commit(commands):
+        """Re-root the tree at the node for the committed commands.
+
+        Returns False if the tree doesn't hold that node or it is dominated.
+        """
+        global committed
+        n = pool.find(nodepool.ROOT, commands[len(committed):])
+        if n < 0 or pool.is_dominated(n):
+            return False
+        mapping = pool.reroot(n)
+        committed = commands
+        old_explorable = explorable_nodes.items[:]
+        for old in old_explorable:
+            explorable_nodes.discard(old)
+            explore_heap.discard(old)
+        for old in old_explorable:
+            if old in mapping:
+                explorable_nodes.add(mapping[old])
+                explore_heap.push(mapping[old], pool.score[mapping[old]])
+        for map_str, old in map_to_node.items():
+            if old in mapping:
+                map_to_node[map_str] = mapping[old]
+            else:
+                del map_to_node[map_str]
+        print 'COMMIT %s, %d nodes left' % (committed, len(pool))
+        return True
+
+    def seed(commands):
+        """Add the nodes along commands, so the search starts out around them"""
+        n = root
+        for cmd in commands:
+            child = pool.child(n, cmd)
+            if child == PRUNED:
+                break
+            if child != NO_NODE:
+                n = child
+                continue
+            if cmd not in pool.unexplored_commands(n):
+                break
+            w = pool.world(n).move(cmd)
+            map_str = world_to_map_str(w)
+            if map_str in map_to_node:
+                break
+            pool.take_unexplored(n, cmd)
+            if not pool.has_unexplored(n):
+                drop_node(n)
+            n = add_node(n, w, map_str, cmd)
+            pool.propagate_max_score(n)
+
+    root = add_node(NO_NODE, initial_world, world_to_map_str(initial_world), None)
+    initial_path = opts.initial_path
+    if solution_store is not None and not initial_path:
+        cached = solution_store.get(initial_world)
+        if cached is not None:
+            best_score, initial_path = cached
+            best_commands = initial_path
+            print 'cached score %d for [%s]' % cached
+            if best_score >= pool.upper_bound(root):
+                # nothing can do better
+                print 'best score %d for [%s]' % (best_score, best_commands)
+                return
+    if initial_path:
+        seed(initial_path)
 
     itercount = 0
     while True:
         if debug_mode or ((itercount % 1000) == 0):
             print '%d nodes, %d explorable nodes' % (node_count, len(explorable_nodes))
             print 'best score %d for [%s]' % (best_score, best_commands)
-            #root.pprint(indent=0, depth_left=2)
+            print 'checkpoint interval %d, %d checkpoints, %d cached worlds' % (store.interval, len(store.checkpoints), len(store.cache))
+            #pool.pprint(root, indent=0, depth_left=2)
         itercount += 1
+        store.tick()
+        if committer is not None and itercount % 100 == 0:
+            commands = committer.ready()
+            if commands is not None and commit(commands):
+                committer.accept(commands)
 
         # pick next node to explore
         if random.random() > 0.5:
-            tries = 0
-            while True:
-                if not explorable_nodes:
-                    from_node = None
-                    break
-
-                debug('random pick')
-
-                from_node = random.choice(explorable_nodes)
-
-                debug('picked node [%s]' % from_node.command_history)
-
-                if from_node.dominated:
-                    debug('  node was dominated, ignore')
-                elif not from_node.unexplored_commands:
-                    debug('  no unexplored commands from this node')
-                else:
-                    break
-
-                tries += 1
-                if tries > 2:
-                    # compact
-                    pre_len = len(explorable_nodes)
-                    explorable_nodes = [n for n in explorable_nodes if (not n.dominated) and (n.unexplored_commands)]
-                    debug('compacted explore list from %d to %d' % (pre_len, len(explorable_nodes)))
+            debug('random pick')
+            pick = explorable_nodes.choice
         else:
-            while True:
-                if not explore_heapq:
-                    from_node = None
-                    break
-
-                debug('queue pick')
-
-                _, from_node = explore_heapq[0]
-                debug('picked node [%s]' % from_node.command_history)
-
-                if from_node.dominated:
-                    debug('  node was dominated, ignore')
-                    heappop(explore_heapq) # throw it out so we don't get it again
-                elif not from_node.unexplored_commands:
-                    debug('  no unexplored commands from this node')
-                    heappop(explore_heapq) # throw it out so we don't get it again
-                else:
-                    break
-
-        # this will happen if we ran out of nodes during compacting
-        if not from_node:
+            debug('queue pick')
+            pick = explore_heap.peek
+        while True:
+            if not explorable_nodes:
+                from_node = None
+                break
+
+            from_node = pick()
+            if debug_mode:
+                debug('picked node [%s]' % pool.path(from_node))
+
+            if pool.is_dominated(from_node):
+                # descendants of a dominated node only find out when we get here
+                debug('  node was dominated, ignore')
+                drop_node(from_node)
+            elif pool.upper_bound(from_node) <= best_score:
+                debug('  node can not beat the best score, ignore')
+                drop_node(from_node)
+            else:
+                break
+
+        # this will happen if we ran out of nodes
+        if from_node is None:
             break
 
-        next_command = random.choice(from_node.unexplored_commands)
-        from_node.unexplored_commands.remove(next_command)
-        debug('  trying command %s from node %s' % (next_command, from_node.command_history))
+        next_command = pool.pop_unexplored(from_node)
+        if not pool.has_unexplored(from_node):
+            drop_node(from_node)
+        if debug_mode:
+            debug('  trying command %s from node %s' % (next_command, pool.path(from_node)))
 
-        assert next_command not in from_node.child_nodes
+        assert pool.child(from_node, next_command) == NO_NODE
 
-        next_world = from_node.world.move(next_command)
+        macro = None
+        if opts.macros:
+            macro = macros.tunnel_macro(pool.world(from_node), next_command)
+        if macro is not None:
+            macro_commands, next_world = macro
+        else:
+            next_world = pool.world(from_node).move(next_command)
 
         # see if next world is already in some node
         next_map_str = world_to_map_str(next_world)
         matched_node = map_to_node.get(next_map_str)
-        if matched_node is not None and next_world.num_moves >= matched_node.world.num_moves:
+        if matched_node is not None and next_world.num_moves >= pool.num_moves[matched_node]:
             # this command lead to a map we've already seen, with more moves, so it's useless
-            debug('  dominated by [%s]' % matched_node.command_history)
-            from_node.child_nodes[next_command] = None # mark this edge as useless
+            if debug_mode:
+                debug('  dominated by [%s]' % pool.path(matched_node))
+            pool.set_child(from_node, next_command, PRUNED) # mark this edge as useless
         else:
             # we're going to make a new node
             debug('  adding new node for command %s' % next_command)
-            new_node = add_node(from_node, next_world, next_map_str, from_node.command_history+next_command)
-            from_node.child_nodes[next_command] = new_node
+            if macro is not None:
+                pool.set_macro(from_node, macro_commands)
+            new_node = add_node(from_node, next_world, next_map_str, next_command)
 
-            # if we outdid another node, need to mark it and all its children as dominated
-            if matched_node:
+            # if we outdid another node, it and all its children are dominated
+            if matched_node is not None:
                 debug('  marking dominated nodes')
-                matched_node.parent = from_node # who's your daddy now, bitch!
-                q = [matched_node]
-                while q:
-                    n = q.pop()
-                    n.dominated = True
-                    for ch in n.child_nodes.values():
-                        if ch is not None:
-                            q.append(ch)
+                pool.dominate(matched_node)
+                drop_node(matched_node)
 
             # update max scores up chain as necessary
-            ms = new_node.score
-            p = new_node.parent_node
-            while True:
-                if not p or ms <= p.max_child_score:
-                    break
-                p.max_child_score = ms
-                p = p.parent_node
-
-def main_wrapper():
+            pool.propagate_max_score(new_node)
+
+def main_wrapper(opts):
     try:
-        main()
+        main(opts)
     except KeyboardInterrupt:
         pass
 
 if __name__ == '__main__':
     parser = optparse.OptionParser()
     parser.add_option('--profile', default=False, action='store_true')
+    parser.add_option('--checkpoint-interval', default=1, type='int',
+                      help='only keep the World of every Nth tree level, replay the rest')
+    parser.add_option('--memory-budget', default=0, type='int',
+                      help='approximate MB to spend on stored worlds')
+    parser.add_option('--max-slowdown', default=2.0, type='float',
+                      help='tighten checkpoints when replay makes iterations this much slower')
+    parser.add_option('--macros', default=False, action='store_true',
+                      help='walk one-wide corridors in a single step')
+    parser.add_option('--commit-step', default=0, type='int',
+                      help='commit the best path this many moves at a time and drop the rest of the tree, 0 to never commit')
+    parser.add_option('--commit-hold', default=5.0, type='float',
+                      help='seconds the next moves of the best path must stay unchanged before they are committed')
+    parser.add_option('--initial-path', default='',
+                      help='commands to start the search around, instead of the cached solution')
+    parser.add_option('--solutions', default=solutions.DEFAULT_DIRECTORY,
+                      help='directory of best known solutions to start from and add to, empty for none')
     opts, args = parser.parse_args()
     if opts.profile:
         profile_path = "profile.pstats"
         if os.path.exists(profile_path):
             os.unlink(profile_path)
-        cProfile.runctx("main_wrapper()", globals(), locals(), profile_path)
+        cProfile.runctx("main_wrapper(opts)", globals(), locals(), profile_path)
         stats = pstats.Stats(profile_path)
         stats.sort_stats('cumulative')
         stats.print_stats()
         os.unlink(profile_path)
     else:
-        main_wrapper()
+        main_wrapper(opts)
@@ -1,128 +1,591 @@
 import world
+import nodepool
+import rollout
+import macros
+import polish
+import replay
+import solutions
+from nodepool import NO_NODE, DEAD_END, DONE, MOVE_INDEX, NUM_MOVES
+import array
 import random
 import math
+import multiprocessing
+import optparse
+import Queue
+import time
+import util
 
 def ucb1_formula(lever_picks, lever_total_reward, total_picks):
     'gives score for a single lever'
     return float(lever_total_reward)/lever_picks + math.sqrt(2.0*math.log(total_picks)/lever_picks)
 
-class Node(object):
-    def __init__(self, parent_node, w, command_history):
-        self.parent_node = parent_node
-        self.world = w
-        self.command_history = command_history
-        self.unexplored_commands = list(self.world.valid_moves())
-        #print 'unexplored_commands', self.unexplored_commands
-        self.child_nodes = {} # map from command character to node
-        self.total_picks = 0
-        self.total_reward = 0
-        self.dead_end = False
-
-    def pprint(self, indent=0):
-        print '%s[%s] %s reward, %d picks%s' % (' '*indent, ''.join(self.command_history), self.total_reward, self.total_picks, ' DONE' if self.dead_end else '')
-        for cmd, child in self.child_nodes.items():
-            child.pprint(indent+2)
+def rave_beta(total_picks, k):
+    """Get the weight of the AMAF mean after total_picks parent visits.
 
-if __name__ == "__main__":
-    initial_world = world.read_world([])
-    print initial_world
+    It starts at 1 and decays towards 0, k is the parent visit count at
+    which both means count the same.
+    """
+    return math.sqrt(k / (3.0*total_picks + k))
+
+def rave_formula(lever_picks, lever_total_reward, total_picks, rave_picks, rave_total_reward, k):
+    """ucb1_formula with the mean reward blended with the AMAF mean"""
+    mean = float(lever_total_reward)/lever_picks
+    if rave_picks:
+        beta = rave_beta(total_picks, k)
+        mean = (1.0 - beta)*mean + beta*float(rave_total_reward)/rave_picks
+    return mean + math.sqrt(2.0*math.log(total_picks)/lever_picks)
+
+def prefix_code(code, cmd):
+    """Extend the shared-table code of a command prefix by one command"""
+    return code * 8 + MOVE_INDEX[cmd] + 1
+
+class SharedTree(object):
+    """Visit statistics for the top levels of the tree, in shared memory.
+
+    Every command prefix of up to .depth commands has a slot, so workers
+    that expand the same prefix in their own trees share its statistics.
+    Workers add a virtual loss to the slots they are descending through so
+    that the others spread out instead of all following the same path.
+    """
+
+    def __init__(self, depth, virtual_loss):
+        size = 8 ** depth
+        self.depth = depth
+        self.virtual_loss = virtual_loss
+        self.visits = multiprocessing.RawArray('l', size)
+        self.reward = multiprocessing.RawArray('d', size)
+        self.pending = multiprocessing.RawArray('l', size)
+        self.lock = multiprocessing.Lock()
+
+    def stats(self, code):
+        """Get (visits, reward) for a slot, counting pending visits as losses"""
+        pending = self.pending[code]
+        return (self.visits[code] + pending,
+                self.reward[code] + pending * self.virtual_loss)
+
+    def descend(self, codes):
+        with self.lock:
+            for code in codes:
+                self.pending[code] += 1
+
+    def backup(self, codes, reward):
+        with self.lock:
+            for code in codes:
+                self.pending[code] -= 1
+                self.visits[code] += 1
+                self.reward[code] += reward
+
+class RootStats(object):
+    """Root child statistics published by each worker for root parallelism"""
+
+    def __init__(self, num_workers):
+        size = num_workers * nodepool.NUM_MOVES
+        self.num_workers = num_workers
+        self.visits = multiprocessing.RawArray('l', size)
+        self.reward = multiprocessing.RawArray('d', size)
+
+    def publish(self, worker, pool, root):
+        base = worker * nodepool.NUM_MOVES
+        for cmd, child in pool.child_items(root):
+            i = base + MOVE_INDEX[cmd]
+            self.visits[i] = pool.visits[child]
+            self.reward[i] = pool.total_reward[child]
+
+    def others(self, worker, cmd):
+        """Get (visits, reward) of a root child summed over the other workers"""
+        visits = 0
+        reward = 0.0
+        for w in xrange(self.num_workers):
+            if w != worker:
+                i = w * nodepool.NUM_MOVES + MOVE_INDEX[cmd]
+                visits += self.visits[i]
+                reward += self.reward[i]
+        return visits, reward
+
+class RaveTable(object):
+    """All-moves-as-first statistics of the tree's nodes
+
+    A playout credits its reward to a child of a node on its path if the
+    child's (robot cell, command) pair was played at or after that node,
+    in the tree or in the playout.
+    """
+
+    def __init__(self, w, k):
+        self.width = w.size()[0]
+        self.k = k
+        self.visits = array.array('i')
+        self.reward = array.array('d')
+
+    def slot(self, robot, cmd):
+        x, y = robot
+        return (y * self.width + x) * NUM_MOVES + MOVE_INDEX[cmd]
+
+    def stats(self, n):
+        """Get (visits, reward) of node n"""
+        if n >= len(self.visits):
+            return 0, 0.0
+        return self.visits[n], self.reward[n]
+
+    def credit(self, n, reward):
+        missing = n + 1 - len(self.visits)
+        if missing > 0:
+            self.visits.extend([0] * missing)
+            self.reward.extend([0.0] * missing)
+        self.visits[n] += 1
+        self.reward[n] += reward
+
+    def remap(self, mapping):
+        """Renumber the nodes after NodePool.reroot()"""
+        visits = array.array('i', [0]) * len(mapping)
+        reward = array.array('d', [0.0]) * len(mapping)
+        for old, new in mapping.iteritems():
+            if old < len(self.visits):
+                visits[new] = self.visits[old]
+                reward[new] = self.reward[old]
+        self.visits = visits
+        self.reward = reward
+
+class UCTSearch(object):
+    """Single-tree UCT search with random playouts
+
+    shared -- a SharedTree for tree parallelism, or None
+    root_stats -- a RootStats for root parallelism, or None
+    rave_k -- blend in RAVE statistics with this equivalence parameter, or None
+    use_macros -- walk one-wide corridors as a single edge
+    """
+
+    def __init__(self, initial_world, max_depth=100, shared=None, root_stats=None, worker=0, transpositions=True,
+                 rave_k=None, use_macros=False):
+        self.pool = nodepool.NodePool()
+        self.root = self.pool.add(NO_NODE, None, initial_world, initial_world.useful_moves())
+        self.transpositions = None
+        if transpositions:
+            # maps (world key, num_moves) to node id
+            self.transpositions = {(initial_world.key(), initial_world.num_moves): self.root}
+        self.playout = rollout.Rollout(max_depth=max_depth)
+        self.use_macros = use_macros
+        self.rave = None
+        if rave_k is not None:
+            self.rave = RaveTable(initial_world, rave_k)
+        self.shared = shared
+        self.root_stats = root_stats
+        self.worker = worker
+        self.best_score = None
+        self.best_commands = None
+        self.node_count = 1
+        self.playout_count = 0
+        self.committed = '' # commands before the current root
+        self.exhausted = False
+
+    def seed(self, w, commands):
+        """Start with commands from world w as the best, if they are valid and better"""
+        end = replay.play(w, commands)
+        if end is not None and (self.best_score is None or end.score() > self.best_score):
+            self.best_score = end.score()
+            self.best_commands = commands
+
+    def commit(self, commands):
+        """Re-root the tree at the node reached by the committed commands.
+
+        Returns False if the tree doesn't hold that node yet or the game is
+        over there.
+        """
+        assert self.shared is None and self.root_stats is None
+        pool = self.pool
+        n = pool.find(self.root, commands[len(self.committed):])
+        if n < 0 or pool.is_flagged(n, DEAD_END):
+            return False
+        mapping = pool.reroot(n)
+        self.root = nodepool.ROOT
+        if self.rave is not None:
+            self.rave.remap(mapping)
+        if self.transpositions is not None:
+            self.transpositions = dict((key, mapping[old]) for key, old in self.transpositions.iteritems()
+                                       if old in mapping)
+        self.committed = commands
+        return True
+
+    def mark_dead_ends(self, tree_path):
+        """Flag the nodes of tree_path, bottom up, whose children are all dead ends.
 
-    tree_root = Node(None, initial_world, [])
+        A node can have several parents, so this follows the path we took
+        rather than the pool's parent ids.  Other parents notice in select().
+        """
+        pool = self.pool
+        for p in reversed(tree_path):
+            if pool.has_unexplored(p) or not all(pool.is_flagged(c, DEAD_END) for c in pool.child_ids(p)):
+                break
+            pool.set_flag(p, DEAD_END)
 
-    best_run_score = None
-    best_run_commands = None
+    def cannot_improve(self, n):
+        return self.best_score is not None and self.pool.upper_bound(n) <= self.best_score
 
-    node_count = 1
+    def child_stats(self, ptr, depth, code, cmd, child):
+        """Get (visits, reward, parent visits) used to score a child"""
+        pool = self.pool
+        shared = self.shared
+        if shared is not None and depth < shared.depth:
+            visits, reward = shared.stats(prefix_code(code, cmd))
+            total, _ = shared.stats(code)
+            return visits, reward, total
+        visits = pool.visits[child]
+        reward = pool.total_reward[child]
+        total = pool.visits[ptr]
+        if self.root_stats is not None and ptr == self.root:
+            other_visits, other_reward = self.root_stats.others(self.worker, cmd)
+            visits += other_visits
+            reward += other_reward
+            total += other_visits
+        return visits, reward, total
 
-    while True:
-        #print '-'*20
-        #tree_root.pprint()
+    def select(self):
+        """Walk down the tree and expand one new node.
 
+        Returns (tree_path, command_path, frontier_world), or None once
+        no node in the tree can beat the best score.  command_path has the
+        first command of each edge taken.
+        """
+        pool = self.pool
         while True:
+            if pool.is_flagged(self.root, DEAD_END):
+                return None
             # start at root, doing bandit picks, until we get to a place where we don't have a node yet
-            ptr = tree_root # start at tree root
+            ptr = self.root # start at tree root
             tree_path = [] # record our path down through tree
             command_path = []
+            code = 0
 
             while True:
-                if ptr.world.is_done():
-                    frontier_world = None
+                if pool.is_flagged(ptr, DONE):
                     break
 
                 tree_path.append(ptr)
-                if ptr.unexplored_commands:
+                if pool.has_unexplored(ptr):
                     # if there are commands from this point that we haven't tried yet, try one at random
-                    next_cmd = random.choice(ptr.unexplored_commands)
-                    ptr.unexplored_commands.remove(next_cmd)
-                    assert next_cmd not in ptr.child_nodes
-                    next_world = ptr.world.move(next_cmd)
-                    new_node = Node(ptr, next_world, ptr.command_history+[next_cmd])
-                    node_count += 1
-                    ptr.child_nodes[next_cmd] = new_node
-
-                    if next_world.is_done():
-                        new_node.dead_end = True
-                        p = new_node.parent_node
-                        while True:
-                            if not p:
-                                break
-                            if all(c.dead_end for c in p.child_nodes.values()):
-                                p.dead_end = True
-                            p = p.parent_node
+                    next_cmd = pool.pop_unexplored(ptr)
+                    assert pool.child(ptr, next_cmd) == NO_NODE
+                    macro = None
+                    if self.use_macros:
+                        macro = macros.tunnel_macro(pool.world(ptr), next_cmd)
+                    if macro is not None:
+                        pool.set_macro(ptr, macro[0])
+                        next_world = macro[1]
+                    else:
+                        next_world = pool.world(ptr).move(next_cmd)
+                    new_node = None
+                    if self.transpositions is not None:
+                        key = (next_world.key(), next_world.num_moves)
+                        new_node = self.transpositions.get(key)
+                    if new_node is not None:
+                        # we got here by another path already, share its node
+                        pool.set_child(ptr, next_cmd, new_node)
+                        next_world = pool.world(new_node)
+                    else:
+                        new_node = pool.add(ptr, next_cmd, next_world, next_world.useful_moves())
+                        self.node_count += 1
+                        if self.transpositions is not None:
+                            self.transpositions[key] = new_node
+                        if next_world.is_done() or self.cannot_improve(new_node):
+                            pool.set_flag(new_node, DEAD_END)
+
+                    if pool.is_flagged(new_node, DEAD_END):
+                        self.mark_dead_ends(tree_path)
 
                     tree_path.append(new_node)
                     command_path.append(next_cmd)
-                    frontier_world = new_node.world
-                    break
+                    return tree_path, command_path, next_world
                 else:
                     # no unexplored commands from this point, so use bandit algo to pick which child to go to
+                    depth = len(command_path)
+                    rave = self.rave
                     scored_cmds = [] # list of (score, cmd) tuples
-                    for (cmd, child) in ptr.child_nodes.items():
-                        if child.dead_end:
+                    for (cmd, child) in pool.child_items(ptr):
+                        if pool.is_flagged(child, DEAD_END):
                             continue
-                        scored_cmds.append((ucb1_formula(child.total_picks, child.total_reward, ptr.total_picks), cmd))
+                        visits, reward, total = self.child_stats(ptr, depth, code, cmd, child)
+                        if rave is not None:
+                            rave_visits, rave_reward = rave.stats(child)
+                            score = rave_formula(visits, reward, total, rave_visits, rave_reward, rave.k)
+                        else:
+                            score = ucb1_formula(visits, reward, total)
+                        scored_cmds.append((score, cmd, child))
                     scored_cmds.sort(reverse=True)
-                    cmd = scored_cmds[0][1]
-                    ptr = ptr.child_nodes[cmd] # move pointer to best child
+                    # only the bounds of the children we'd take get worked out
+                    for _, cmd, child in scored_cmds:
+                        if not self.cannot_improve(child):
+                            break
+                        pool.set_flag(child, DEAD_END)
+                    else:
+                        # every child became a dead end, through another parent or the bound
+                        self.mark_dead_ends(tree_path)
+                        break
+                    ptr = child # move pointer to best child
                     command_path.append(cmd)
-
-            if frontier_world is not None:
-                break
+                    code = prefix_code(code, cmd)
             # otherwise we failed to find a frontier world, go back to top of loop
 
-        # now we explore on randomly from frontier_world
+    def shared_codes(self, command_path):
+        """Get the shared-table codes of the root and the shared-level prefixes"""
+        codes = [0]
+        code = 0
+        for cmd in command_path[:self.shared.depth]:
+            code = prefix_code(code, cmd)
+            codes.append(code)
+        return codes
 
-        #print tree_path
+    def tree_commands(self, tree_path, command_path):
+        """Get the commands along a selected path, macros spelled out"""
+        pool = self.pool
+        return ''.join(pool.edge_commands(node, cmd) for node, cmd in zip(tree_path, command_path))
 
-        # now we play a "random" game from this point forward, until end (or maybe some limit)
-        depth = 0
-        while True:
-            if frontier_world.is_done():
-                final_score = frontier_world.score()
-                break
-            elif depth > 100:
-                frontier_world.move('A')
-                command_path.append('A')
-                final_score = frontier_world.score()
-                break
-            else:
-                vc = list(frontier_world.valid_moves())
-                cmd = random.choice(vc)
-                frontier_world = frontier_world.move(cmd)
-                command_path.append(cmd)
-                depth += 1
+    def update_rave(self, tree_path, command_path, reward):
+        """Credit reward to the children of the nodes on tree_path played after them"""
+        rave = self.rave
+        pool = self.pool
+        playout = self.playout
+        history = playout.history
+        positions = playout.positions
+        played = set(positions[i] * NUM_MOVES + MOVE_INDEX[chr(history[i])]
+                     for i in xrange(playout.length))
+        # bottom up, so played only holds what came after each node
+        for i in xrange(len(tree_path) - 1, -1, -1):
+            node = tree_path[i]
+            robot = pool.world(node).robot
+            if i < len(command_path):
+                played.add(rave.slot(robot, command_path[i]))
+            for cmd, child in pool.child_items(node):
+                if child >= 0 and rave.slot(robot, cmd) in played:
+                    rave.credit(child, reward)
+
+    def iterate(self):
+        """Run one playout.  Returns True if it found a new best.
 
-        print 'finished random play with score %s: %s' % (final_score, ''.join(command_path))
-        if best_run_score is None or final_score > best_run_score:
-            print 'NEWBEST'
-            best_run_score = final_score
-            best_run_commands = ''.join(command_path)
+        Sets .exhausted once there is nothing left to search.
+        """
+        selected = self.select()
+        if selected is None:
+            self.exhausted = True
+            return False
+        tree_path, command_path, frontier_world = selected
+        codes = None
+        if self.shared is not None:
+            codes = self.shared_codes(command_path)
+            self.shared.descend(codes)
 
-        print '%d nodes, current best %s %s' % (node_count, best_run_score, best_run_commands)
+        # now we play a "random" game from this point forward, until end (or maybe some limit)
+        playout = self.playout
+        playout.reset(frontier_world)
+        final_score, playout_length = playout.play()
+        self.playout_count += 1
 
         reward = final_score
 
         # now update all the nodes in the tree that we took to get here
+        pool = self.pool
         for node in tree_path:
-            node.total_picks += 1
-            node.total_reward += reward
+            pool.visits[node] += 1
+            pool.total_reward[node] += reward
+        if codes is not None:
+            self.shared.backup(codes, reward)
+        if self.rave is not None:
+            self.update_rave(tree_path, command_path, reward)
+
+        if self.best_score is None or final_score > self.best_score:
+            self.best_score = final_score
+            self.best_commands = self.committed + self.tree_commands(tree_path, command_path) + playout.commands()
+            return True
+        return False
+
+def run_worker(worker, initial_world, opts, shared, root_stats, results):
+    """Search until the tree is exhausted, putting each new best on results.
+
+    Puts None at the end, unless interrupted.
+    """
+    random.seed() # forked workers all start with the parent's random state
+    search = UCTSearch(initial_world,
+                       max_depth=opts.max_depth,
+                       shared=shared,
+                       root_stats=root_stats,
+                       worker=worker,
+                       transpositions=opts.transpositions,
+                       rave_k=opts.rave_k if opts.rave else None,
+                       use_macros=opts.macros)
+    if opts.seed:
+        search.seed(initial_world, opts.seed)
+    try:
+        while not search.exhausted:
+            if search.iterate():
+                results.put((search.best_score, search.best_commands))
+            if root_stats is not None and search.playout_count % opts.sync_interval == 0:
+                root_stats.publish(worker, search.pool, search.root)
+        results.put(None)
+    except KeyboardInterrupt:
+        pass
+
+def polished(initial_world, commands, opts):
+    """Get commands with up to opts.polish seconds spent polishing them"""
+    if not commands:
+        return world.ABORT
+    if opts.polish <= 0:
+        return commands
+    commands, points = polish.polish(initial_world, commands, time.time() + opts.polish)
+    print 'polishing won back %d points' % points
+    return commands
+
+def search_deadline(opts):
+    """Get the time to stop searching at, leaving time to polish, or None"""
+    if opts.time <= 0:
+        return None
+    return time.time() + max(0.0, opts.time - opts.polish)
+
+def main_parallel(initial_world, opts):
+    """Run opts.workers searches and report the best playout of any of them"""
+    shared = None
+    root_stats = None
+    if opts.tree_parallel:
+        # a pending visit counts as the worst playout we could get
+        shared = SharedTree(opts.shared_depth, virtual_loss=-float(opts.max_depth))
+    else:
+        root_stats = RootStats(opts.workers)
+    results = multiprocessing.Queue()
+    workers = []
+    for i in xrange(opts.workers):
+        p = multiprocessing.Process(target=run_worker,
+                                    args=(i, initial_world, opts, shared, root_stats, results))
+        p.daemon = True
+        p.start()
+        workers.append(p)
+
+    best_score = None
+    best_commands = ''
+    if opts.seed:
+        # the workers only report playouts that beat it
+        end = replay.play(initial_world, opts.seed)
+        if end is not None:
+            best_score = end.score()
+            best_commands = opts.seed
+    solution_store = opts.solution_store
+    deadline = search_deadline(opts)
+    running = len(workers)
+    try:
+        while running and (deadline is None or time.time() < deadline):
+            timeout = 1.0
+            if deadline is not None:
+                timeout = max(0.01, min(timeout, deadline - time.time()))
+            try:
+                result = results.get(timeout=timeout)
+            except Queue.Empty:
+                continue
+            if result is None:
+                running -= 1 # that worker has searched its whole tree
+                continue
+            score, commands = result
+            if best_score is None or score > best_score:
+                print 'NEWBEST'
+                best_score = score
+                best_commands = commands
+                print 'current best %s %s' % (best_score, best_commands)
+                if solution_store is not None:
+                    solution_store.put(initial_world, best_commands, best_score)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in workers:
+            p.terminate()
+    print polished(initial_world, best_commands, opts)
+
+def main(opts):
+    initial_world = world.read_world([])
+    print initial_world
+
+    opts.solution_store = None
+    opts.seed = opts.initial_path
+    if opts.solutions:
+        opts.solution_store = solutions.SolutionStore(opts.solutions)
+        cached = opts.solution_store.get(initial_world)
+        if cached is not None:
+            print 'cached score %d for [%s]' % cached
+            if cached[0] >= initial_world.upper_bound():
+                # nothing can do better
+                print cached[1]
+                return
+            if not opts.seed:
+                opts.seed = cached[1]
+
+    if opts.workers > 1:
+        if opts.commit_step:
+            print 'commit mode only works with a single worker'
+        main_parallel(initial_world, opts)
+        return
+
+    search = UCTSearch(initial_world,
+                       max_depth=opts.max_depth,
+                       transpositions=opts.transpositions,
+                       rave_k=opts.rave_k if opts.rave else None,
+                       use_macros=opts.macros)
+    if opts.seed:
+        search.seed(initial_world, opts.seed)
+    committer = None
+    if opts.commit_step:
+        committer = util.PrefixCommitter(opts.commit_step, opts.commit_hold)
+    deadline = search_deadline(opts)
+    try:
+        while not search.exhausted and (deadline is None or time.time() < deadline):
+            #print '-'*20
+            #search.pool.pprint(search.root)
+            if search.iterate():
+                print 'NEWBEST'
+                if committer is not None:
+                    committer.update(search.best_commands)
+                if opts.solution_store is not None:
+                    opts.solution_store.put(initial_world, search.best_commands, search.best_score)
+
+            if committer is not None and search.playout_count % 100 == 0:
+                commands = committer.ready()
+                if commands is not None and search.commit(commands):
+                    committer.accept(commands)
+                    print 'COMMIT %s, %d nodes left' % (commands, len(search.pool))
+
+            if search.playout_count % 1000 == 0:
+                print '%d nodes, %d playouts, current best %s %s' % (search.node_count, search.playout_count, search.best_score, search.best_commands)
+    except KeyboardInterrupt:
+        pass
+    print polished(initial_world, search.best_commands, opts)
+
+def option_parser():
+    parser = optparse.OptionParser()
+    parser.add_option('--time', default=0, type='float',
+                      help='seconds to search before printing the best path, 0 to run until interrupted')
+    parser.add_option('--max-depth', default=100, type='int',
+                      help='playout moves before the robot aborts')
+    parser.add_option('--workers', default=1, type='int',
+                      help='number of search processes')
+    parser.add_option('--tree-parallel', default=False, action='store_true',
+                      help='share the top of the tree between workers instead of merging root statistics')
+    parser.add_option('--shared-depth', default=3, type='int',
+                      help='tree levels shared between workers with --tree-parallel')
+    parser.add_option('--sync-interval', default=100, type='int',
+                      help='playouts between root statistic merges')
+    parser.add_option('--no-transpositions', dest='transpositions', default=True, action='store_false',
+                      help='keep a pure tree instead of sharing nodes between move orders')
+    parser.add_option('--rave', default=False, action='store_true',
+                      help='blend all-moves-as-first statistics into child selection')
+    parser.add_option('--rave-k', default=25, type='float',
+                      help='parent visits at which RAVE and UCT statistics weigh the same')
+    parser.add_option('--macros', default=False, action='store_true',
+                      help='walk one-wide corridors in a single step')
+    parser.add_option('--commit-step', default=0, type='int',
+                      help='commit the best path this many moves at a time and drop the rest of the tree, 0 to never commit')
+    parser.add_option('--commit-hold', default=5.0, type='float',
+                      help='seconds the next moves of the best path must stay unchanged before they are committed')
+    parser.add_option('--initial-path', default='',
+                      help='commands to start out with as the best, instead of the cached solution')
+    parser.add_option('--solutions', default=solutions.DEFAULT_DIRECTORY,
+                      help='directory of best known solutions to start from and add to, empty for none')
+    parser.add_option('--polish', default=1.0, type='float',
+                      help='seconds of the time budget kept for polishing the best path, 0 to not polish')
+    return parser
+
+if __name__ == "__main__":
+    opts, args = option_parser().parse_args()
+    main(opts)
@@ -0,0 +1,92 @@
+"""Tunnel macros: walk down a corridor in one step.
+
+In a corridor one cell wide the robot has nothing to decide until it comes
+out at the other end, so the searchers can take the whole walk as a single
+edge instead of branching at every cell.  Corridors only depend on the
+walls and are found once per map.  Every macro is played out with
+World.move() and cut short where anything else happens: a rock moves, the
+robot picks something up, would die or the game ends.
+"""
+import util
+import world
+
+MAX_LENGTH = 64
+
+_DELTAS = {
+    world.LEFT: (-1, 0),
+    world.RIGHT: (1, 0),
+    world.UP: (0, 1),
+    world.DOWN: (0, -1),
+}
+_OPEN = frozenset([world.EMPTY, world.EARTH])
+_NOT_CORRIDOR = frozenset([world.WALL, world.CLOSED, world.OPEN]) | frozenset(world.TRAMPOLINES) | frozenset(world.TARGETS)
+
+class Tunnels(object):
+    """The corridor cells of a map
+
+    Instance Variables:
+    exits -- maps each corridor cell to its two (command, (x, y)) ways out
+    """
+
+    def __init__(self, w):
+        width, height = w.size()
+        self.exits = {}
+        for x, y in w.positions():
+            if w.map[y][x] in _NOT_CORRIDOR:
+                continue
+            ways = []
+            for cmd, (dx, dy) in _DELTAS.iteritems():
+                nx = x + dx
+                ny = y + dy
+                if 0 <= nx < width and 0 <= ny < height and w.map[ny][nx] != world.WALL:
+                    ways.append((cmd, (nx, ny)))
+            if len(ways) == 2:
+                self.exits[x, y] = ways
+
+_tunnels = util.LRUCache(8) # keyed by the map's StaticDistances, which copies share
+
+def tunnels(w):
+    static = w.static_distances()
+    t = _tunnels.get(static)
+    if t is None:
+        t = Tunnels(w)
+        _tunnels.put(static, t)
+    return t
+
+def tunnel_macro(w, cmd):
+    """Get (commands, world) for following the corridor that cmd enters.
+
+    Returns None unless cmd steps into a corridor and the walk takes at
+    least two moves.
+    """
+    exits = tunnels(w).exits
+    dx, dy = _DELTAS.get(cmd, (0, 0))
+    x, y = w.robot
+    entry = (x + dx, y + dy)
+    if (dx, dy) == (0, 0) or entry not in exits or w.at(*entry) not in _OPEN:
+        return None
+
+    commands = []
+    prev = w.robot
+    current = w
+    while len(commands) < MAX_LENGTH:
+        if cmd not in current.valid_moves():
+            break
+        after = current.move(cmd)
+        if after.is_failed():
+            break
+        commands.append(cmd)
+        moved = after.rocks != current.rocks
+        picked_up = (after.lambdas_collected != current.lambdas_collected or
+                     after.num_razors != current.num_razors)
+        prev, current = current.robot, after
+        if moved or picked_up or after.is_done() or after.robot not in exits:
+            break
+        ways = [(c, p) for c, p in exits[after.robot] if p != prev]
+        if len(ways) != 1:
+            break
+        cmd = ways[0][0]
+
+    if len(commands) < 2:
+        return None
+    return ''.join(commands), current
@@ -0,0 +1,132 @@
+"""Routes for the robot over the map as it is now.
+
+The navigation graph has an edge for every step the robot can take without
+pushing a rock: onto empty cells, earth, lambdas and razors, into the open
+lift, and onto a trampoline, which lands it on the target instead.  A jump
+uses up every trampoline with the same target, so a route's state is its
+cell plus the trampolines it has left.  While the robot holds a razor it
+can shave its way into a beard for one extra move, so the state also has
+the razors held, the razors picked up on the way and the beards shaved.
+Costs are exact move counts on the map as it is; rocks that fall and
+beards that grow may still spoil a route, and the robot never steps down
+with a rock right above it.
+"""
+import heapq
+
+import distances
+import world
+
+_DELTAS = [
+    (world.UP, 0, 1),
+    (world.DOWN, 0, -1),
+    (world.LEFT, -1, 0),
+    (world.RIGHT, 1, 0),
+]
+_WALKABLE = frozenset([world.EMPTY, world.EARTH, world.LAMBDA, world.RAZOR, world.ROBOT])
+
+def route(w, goal, start=None):
+    """Get the shortest commands that walk the robot from start to goal.
+
+    start is the robot by default.  Returns None if there is no way, or
+    if every way is drowned by the water first.
+    """
+    if start is None:
+        start = w.robot
+    start = tuple(start)
+    goal = tuple(goal)
+    if start == goal:
+        return ''
+    width, height = w.size()
+    if not (0 <= goal[0] < width and 0 <= goal[1] < height):
+        return None
+    m = w.map
+    static = w.static_distances()
+    if static.distance(start, goal) == distances.UNREACHABLE:
+        return None
+    goal_field = static.field(goal)
+    timeline = w.flood_timeline()
+    doom = timeline.doom(w)
+    trampolines = w.trampolines
+    jumped_to = set(trampolines.itervalues())
+
+    def estimate(pos):
+        return goal_field[pos[1] * width + pos[0]]
+
+    first = (start, frozenset(trampolines), w.num_razors, frozenset(), frozenset())
+    came_from = {first: None}
+    cost = {first: 0}
+    heap = [(estimate(start), 0, first)]
+    while heap:
+        _, g, state = heapq.heappop(heap)
+        if g != cost[state]:
+            continue
+        pos, left, razors, picked, shaved = state
+        if pos == goal:
+            return _commands(came_from, state)
+        x, y = pos
+        for cmd, dx, dy in _DELTAS:
+            nx = x + dx
+            ny = y + dy
+            if nx < 0 or ny < 0 or nx >= width or ny >= height:
+                continue
+            if dy < 0 and y + 1 < height and m[y + 1][x] == world.ROCK:
+                continue # the rock would fall on the robot
+            c = m[ny][nx]
+            steps = cmd
+            dest = (nx, ny)
+            next_left = left
+            next_razors = razors
+            next_picked = picked
+            next_shaved = shaved
+            if dest in picked or dest in shaved:
+                pass # taken or shaved on the way
+            elif dest in left:
+                # jump, using up the trampolines to the same target
+                target = trampolines[dest]
+                next_left = frozenset(t for t in left if trampolines[t] != target)
+                dest = target
+            elif dest == goal and c == world.OPEN:
+                pass
+            elif c in world.TRAMPOLINES:
+                pass # used up already
+            elif c in world.TARGETS:
+                if dest not in jumped_to or dest in [trampolines[t] for t in left]:
+                    continue
+            elif c == world.BEARD:
+                if not razors:
+                    continue
+                steps = world.SHAVE + cmd
+                next_razors = razors - 1
+                next_shaved = shaved | _around(m, x, y, width, height, world.BEARD)
+            elif c == world.RAZOR:
+                next_razors = razors + 1
+                next_picked = picked | frozenset([dest])
+            elif c not in _WALKABLE:
+                continue
+            arrival = g + len(steps)
+            if not timeline.survivable(dest, w.num_moves + arrival, doom):
+                continue
+            h = estimate(dest)
+            if h == distances.UNREACHABLE:
+                continue
+            next_state = (dest, next_left, next_razors, next_picked, next_shaved)
+            if arrival < cost.get(next_state, arrival + 1):
+                cost[next_state] = arrival
+                came_from[next_state] = (state, steps)
+                heapq.heappush(heap, (arrival + h, arrival, next_state))
+    return None
+
+def _around(m, x, y, width, height, symbol):
+    """Get the cells with symbol next to (x, y), diagonals included"""
+    return frozenset((bx, by)
+                     for by in xrange(max(0, y - 1), min(height, y + 2))
+                     for bx in xrange(max(0, x - 1), min(width, x + 2))
+                     if m[by][bx] == symbol)
+
+def _commands(came_from, state):
+    parts = []
+    while came_from[state] is not None:
+        state, steps = came_from[state]
+        parts.append(steps)
+    parts.reverse()
+    return ''.join(parts)
@@ -0,0 +1,421 @@
+"""Array-backed node storage shared by the tree searchers.
+
+Nodes are plain integer ids.  Everything about a node lives in parallel
+arrays indexed by that id, so a node costs a few dozen bytes instead of an
+object, a dict of children, a list of unexplored commands and a copy of the
+whole command history.
+"""
+import array
+import random
+
+import util
+
+MOVES = 'LRUDWSA'
+MOVE_INDEX = dict((m, i) for i, m in enumerate(MOVES))
+NUM_MOVES = len(MOVES)
+
+ROOT = 0
+NO_NODE = -1 # the edge has not been tried yet
+PRUNED = -2 # the edge was tried and leads nowhere useful
+UNKNOWN_BOUND = -(1 << 31) # NodePool.bound of a node not asked about yet
+
+# flags
+DOMINATED = 1
+DEAD_END = 2
+DONE = 4
+
+_empty_children = array.array('i', [NO_NODE] * NUM_MOVES)
+
+def move_mask(commands):
+    """Get the bitmask for a string of commands"""
+    mask = 0
+    for c in commands:
+        mask |= 1 << MOVE_INDEX[c]
+    return mask
+
+class NodePool(object):
+    """Parallel arrays of node data, indexed by node id
+
+    Instance Variables:
+    parent -- the parent id, NO_NODE for the root
+    move -- index into MOVES of the command leading to the node, -1 for the root
+    num_moves -- the number of moves of the node's world
+    score -- the world score of the node
+    max_child_score -- the best score in the node's subtree
+    bound -- World.upper_bound() of the node's world, UNKNOWN_BOUND until upper_bound() asks
+    visits -- how many times the node was picked (UCT)
+    total_reward -- the sum of rewards seen through the node (UCT)
+    flags -- DOMINATED, DEAD_END and DONE bits
+    unexplored -- bitmask over MOVES of the commands not tried yet
+    children -- NUM_MOVES child slots per node, NO_NODE or PRUNED when empty
+    worlds -- the World of each node, or None when a WorldStore evicted it
+    macros -- maps (node, move) to the commands of edges that take more than one
+    """
+
+    def __init__(self):
+        self.parent = array.array('i')
+        self.move = array.array('b')
+        self.num_moves = array.array('i')
+        self.score = array.array('i')
+        self.max_child_score = array.array('i')
+        self.bound = array.array('i')
+        self.visits = array.array('i')
+        self.total_reward = array.array('d')
+        self.flags = array.array('B')
+        self.unexplored = array.array('B')
+        self.children = array.array('i')
+        self.worlds = []
+        self.macros = {}
+        self.store = None
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self, parent, command, w, commands):
+        """Add a node for world w, reached from parent by command.
+
+        commands -- the commands worth exploring from this node
+        """
+        n = len(self.parent)
+        self.parent.append(parent)
+        self.move.append(MOVE_INDEX[command] if command else -1)
+        self.num_moves.append(w.num_moves)
+        score = w.score()
+        self.score.append(score)
+        self.max_child_score.append(score)
+        self.bound.append(UNKNOWN_BOUND)
+        self.visits.append(0)
+        self.total_reward.append(0.0)
+        flags = DONE if w.is_done() else 0
+        if parent != NO_NODE:
+            flags |= self.flags[parent] & DOMINATED
+        self.flags.append(flags)
+        self.unexplored.append(move_mask(commands))
+        self.children.extend(_empty_children)
+        self.worlds.append(w)
+        if parent != NO_NODE:
+            self.children[parent * NUM_MOVES + MOVE_INDEX[command]] = n
+        if self.store is not None:
+            self.store.add(n, w)
+        return n
+
+    def upper_bound(self, n):
+        """Get World.upper_bound() of node n's world, working it out the first time"""
+        bound = self.bound[n]
+        if bound == UNKNOWN_BOUND:
+            bound = self.bound[n] = self.world(n).upper_bound()
+        return bound
+
+    def world(self, n):
+        w = self.worlds[n]
+        if w is None:
+            w = self.store.world(n)
+        return w
+
+    def command(self, n):
+        return MOVES[self.move[n]]
+
+    def path(self, n):
+        """Materialize the command string leading to node n"""
+        cmds = []
+        while self.parent[n] != NO_NODE:
+            cmds.append(self.incoming_commands(n))
+            n = self.parent[n]
+        cmds.reverse()
+        return ''.join(cmds)
+
+    def edge_commands(self, n, command):
+        """Get the commands of the edge leaving n that starts with command"""
+        return self.macros.get((n, MOVE_INDEX[command]), command)
+
+    def incoming_commands(self, n):
+        """Get the commands of the edge from n's parent to n"""
+        m = self.move[n]
+        return self.macros.get((self.parent[n], m), MOVES[m])
+
+    def set_macro(self, n, commands):
+        """Make the edge leaving n with commands[0] take all of commands"""
+        self.macros[n, MOVE_INDEX[commands[0]]] = commands
+
+    def find(self, n, commands):
+        """Follow commands down from n, get the node they lead to or NO_NODE"""
+        i = 0
+        while i < len(commands):
+            cmd = commands[i]
+            edge = self.edge_commands(n, cmd)
+            if commands[i:i + len(edge)] != edge:
+                return NO_NODE
+            n = self.child(n, cmd)
+            if n < 0:
+                return NO_NODE
+            i += len(edge)
+        return n
+
+    def child(self, n, command):
+        return self.children[n * NUM_MOVES + MOVE_INDEX[command]]
+
+    def set_child(self, n, command, child):
+        self.children[n * NUM_MOVES + MOVE_INDEX[command]] = child
+
+    def child_ids(self, n):
+        """Get the ids of the live children of n"""
+        base = n * NUM_MOVES
+        return [c for c in self.children[base:base + NUM_MOVES] if c >= 0]
+
+    def child_items(self, n):
+        """Get (command, child) for every tried edge of n, PRUNED included"""
+        base = n * NUM_MOVES
+        return [(MOVES[i], c) for i, c in enumerate(self.children[base:base + NUM_MOVES]) if c != NO_NODE]
+
+    def has_unexplored(self, n):
+        return self.unexplored[n] != 0
+
+    def unexplored_commands(self, n):
+        mask = self.unexplored[n]
+        return [m for i, m in enumerate(MOVES) if mask & (1 << i)]
+
+    def num_unexplored(self, n):
+        mask = self.unexplored[n]
+        count = 0
+        while mask:
+            mask &= mask - 1
+            count += 1
+        return count
+
+    def pop_unexplored(self, n):
+        """Remove a random unexplored command from n and return it"""
+        cmd = random.choice(self.unexplored_commands(n))
+        self.unexplored[n] &= ~(1 << MOVE_INDEX[cmd])
+        return cmd
+
+    def take_unexplored(self, n, cmd):
+        """Remove cmd from the unexplored commands of n, returns False if it wasn't there"""
+        bit = 1 << MOVE_INDEX[cmd]
+        if not self.unexplored[n] & bit:
+            return False
+        self.unexplored[n] &= ~bit
+        return True
+
+    def is_flagged(self, n, flag):
+        return self.flags[n] & flag != 0
+
+    def set_flag(self, n, flag):
+        self.flags[n] |= flag
+
+    def dominate(self, n):
+        """Mark n and its whole subtree as dominated.
+
+        The walk stops at nodes that are flagged already, and children
+        added later inherit the flag, so every node is flagged at most once
+        and is_dominated() never has to look at the ancestors.
+        """
+        flags = self.flags
+        children = self.children
+        stack = [n]
+        while stack:
+            p = stack.pop()
+            if flags[p] & DOMINATED:
+                continue
+            flags[p] |= DOMINATED
+            base = p * NUM_MOVES
+            for c in children[base:base + NUM_MOVES]:
+                if c >= 0:
+                    stack.append(c)
+
+    def is_dominated(self, n):
+        """Check whether n or any of its ancestors is dominated"""
+        return self.flags[n] & DOMINATED != 0
+
+    def reroot(self, n):
+        """Make n the root and drop every node that can't be reached from it.
+
+        The remaining nodes are renumbered in breadth first order and get
+        the first parent that reaches them.  Returns a dict from old to new
+        ids so callers can remap their own structures.
+        """
+        w = self.world(n)
+        order = [n]
+        mapping = {n: ROOT}
+        parents = [NO_NODE]
+        moves = [-1]
+        children = self.children
+        i = 0
+        while i < len(order):
+            old = order[i]
+            base = old * NUM_MOVES
+            for m in xrange(NUM_MOVES):
+                c = children[base + m]
+                if c >= 0 and c not in mapping:
+                    mapping[c] = len(order)
+                    order.append(c)
+                    parents.append(mapping[old])
+                    moves.append(m)
+            i += 1
+
+        def pick(arr):
+            return array.array(arr.typecode, [arr[o] for o in order])
+        self.parent = array.array('i', parents)
+        self.move = array.array('b', moves)
+        self.num_moves = pick(self.num_moves)
+        self.score = pick(self.score)
+        self.max_child_score = pick(self.max_child_score)
+        self.bound = pick(self.bound)
+        self.visits = pick(self.visits)
+        self.total_reward = pick(self.total_reward)
+        self.flags = pick(self.flags)
+        self.unexplored = pick(self.unexplored)
+        new_children = array.array('i')
+        for o in order:
+            base = o * NUM_MOVES
+            new_children.extend([mapping[c] if c >= 0 else c for c in children[base:base + NUM_MOVES]])
+        self.children = new_children
+        self.worlds = [self.worlds[o] for o in order]
+        self.worlds[ROOT] = w
+        self.macros = dict(((mapping[p], m), cmds) for (p, m), cmds in self.macros.iteritems()
+                           if p in mapping)
+        if self.store is not None:
+            self.store.remap(mapping)
+        return mapping
+
+    def propagate_max_score(self, n):
+        """Push the score of n up the max_child_score chain"""
+        ms = self.score[n]
+        p = self.parent[n]
+        max_child_score = self.max_child_score
+        parent = self.parent
+        while p != NO_NODE and ms > max_child_score[p]:
+            max_child_score[p] = ms
+            p = parent[p]
+
+    def pprint(self, n, indent=0, depth_left=-1):
+        print '%s[%s] %d %d %s' % (' '*indent, self.path(n), self.score[n], self.max_child_score[n], 'DONE' if self.is_flagged(n, DONE) else '')
+        if depth_left == 0:
+            return
+        for cmd, child in self.child_items(n):
+            if child >= 0:
+                self.pprint(child, indent+2, depth_left-1)
+            else:
+                print '%s[%s] None' % (' '*(indent+2), self.path(n)+cmd)
+
+def estimate_world_bytes(w):
+    """Rough size of a materialized World: the row lists dominate"""
+    width, height = w.size()
+    return 8 * width * height + 72 * height + 1024
+
+class WorldStore(object):
+    """Keeps the worlds of a NodePool under a memory budget.
+
+    Nodes at a depth that is a multiple of .interval (and nodes that keep
+    getting rebuilt) are checkpoints and keep their World in pool.worlds.
+    Every other node is rebuilt by replaying its commands from the nearest
+    materialized ancestor.  Rebuilt worlds live in an LRU cache.
+
+    With interval=1 every node is a checkpoint, which is the plain pool.
+    """
+
+    window = 1000
+
+    def __init__(self, pool, interval=1, memory_budget=None, max_slowdown=2.0, world_bytes=1):
+        self.pool = pool
+        pool.store = self
+        self.interval = interval
+        self.world_bytes = world_bytes
+        self.max_checkpoints = None
+        cache_size = 1024
+        if memory_budget is not None:
+            # give half the budget to checkpoints, half to the cache
+            budget_worlds = max(2, memory_budget // world_bytes)
+            self.max_checkpoints = budget_worlds // 2
+            cache_size = max(1, min(cache_size, budget_worlds - self.max_checkpoints))
+        self.cache = util.LRUCache(cache_size)
+        self.max_slowdown = max_slowdown
+        self.checkpoints = []
+        self.rebuilds = {}
+        self.iterations = 0
+        self.replayed = 0
+
+    def add(self, n, w):
+        if self.pool.num_moves[n] % self.interval == 0:
+            self.make_checkpoint(n, w)
+        else:
+            self.pool.worlds[n] = None
+            self.cache.put(n, w)
+
+    def make_checkpoint(self, n, w):
+        self.pool.worlds[n] = w
+        self.checkpoints.append(n)
+        self.cache.discard(n)
+        if self.max_checkpoints is not None and len(self.checkpoints) > self.max_checkpoints:
+            self.thin_checkpoints()
+
+    def thin_checkpoints(self):
+        """Double the interval and drop the checkpoints that no longer fit it"""
+        self.interval *= 2
+        pool = self.pool
+        kept = []
+        for n in self.checkpoints:
+            if pool.parent[n] == NO_NODE or pool.num_moves[n] % self.interval == 0:
+                kept.append(n)
+            else:
+                pool.worlds[n] = None
+        self.checkpoints = kept
+
+    def world(self, n):
+        w = self.cache.get(n)
+        if w is not None:
+            return w
+
+        # walk up to the nearest ancestor that still has a world
+        pool = self.pool
+        commands = []
+        base = n
+        while True:
+            commands.append(pool.incoming_commands(base))
+            base = pool.parent[base]
+            w = pool.worlds[base]
+            if w is not None:
+                break
+            w = self.cache.get(base)
+            if w is not None:
+                break
+        for edge in reversed(commands):
+            for cmd in edge:
+                w = w.move(cmd)
+            self.replayed += len(edge)
+
+        # nodes we keep coming back to are on a hot path, pin them
+        hits = self.rebuilds.get(n, 0) + 1
+        self.rebuilds[n] = hits
+        if hits >= 2 and (self.max_checkpoints is None or len(self.checkpoints) < self.max_checkpoints):
+            del self.rebuilds[n]
+            self.make_checkpoint(n, w)
+        else:
+            self.cache.put(n, w)
+        return w
+
+    def remap(self, mapping):
+        """Follow NodePool.reroot(), forgetting dropped nodes"""
+        self.checkpoints = [mapping[n] for n in self.checkpoints if n in mapping]
+        if ROOT not in self.checkpoints:
+            self.checkpoints.append(ROOT)
+        cache = util.LRUCache(self.cache.capacity)
+        for n, w in self.cache.entries.iteritems():
+            if n in mapping:
+                cache.put(mapping[n], w)
+        cache.discard(ROOT)
+        self.cache = cache
+        self.rebuilds.clear()
+
+    def tick(self):
+        """Called once per search iteration, keeps replay cost in check"""
+        self.iterations += 1
+        if self.iterations < self.window:
+            return
+        # one move per iteration is what the search costs without replay
+        slowdown = float(self.iterations + self.replayed) / self.iterations
+        if slowdown > self.max_slowdown and self.interval > 1:
+            if self.max_checkpoints is None or len(self.checkpoints) * 2 < self.max_checkpoints:
+                self.interval = max(1, self.interval // 2)
+        self.iterations = 0
+        self.replayed = 0
+        self.rebuilds.clear()
@@ -0,0 +1,71 @@
+"""Command strings that share their prefixes.
+
+A Path is a link to the path it extends plus one command, so extending a
+path is O(1) no matter how long it is, and every World descended from the
+same ancestor shares that ancestor's links.  The full string is only built
+by str(), which should be saved for reporting solutions.
+"""
+
+class Path(object):
+    __slots__ = ['parent', 'move', 'length']
+
+    def __init__(self, parent=None, move=''):
+        self.parent = parent
+        self.move = move
+        self.length = parent.length + 1 if parent is not None else 0
+
+    def __add__(self, commands):
+        p = self
+        for c in commands:
+            p = Path(p, c)
+        return p
+
+    def __len__(self):
+        return self.length
+
+    def __nonzero__(self):
+        return self.length > 0
+
+    def __str__(self):
+        moves = []
+        p = self
+        while p.parent is not None:
+            moves.append(p.move)
+            p = p.parent
+        moves.reverse()
+        return ''.join(moves)
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, Path):
+            if self.length != other.length:
+                return False
+            a, b = self, other
+            while a is not b:
+                if a.move != b.move:
+                    return False
+                a, b = a.parent, b.parent
+            return True
+        return str(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def last(self):
+        """The last command, or '' for the empty path"""
+        return self.move
+
+EMPTY = Path()
+
+def as_path(commands):
+    """Get a Path for a Path or a command string"""
+    if isinstance(commands, Path):
+        return commands
+    return EMPTY + commands
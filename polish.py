@@ -0,0 +1,138 @@
+"""Take the detours out of a finished path.
+
+The searchers stop at the first path that scores well, and those paths
+still carry waits, steps that are taken back and roundabout walks between
+lambdas, each of them a point lost.  polish() tries local rewrites of a
+path: aborting right after the last useful move, walking each leg between
+two pickups again along a nav route, and deleting single commands and
+pairs of them.  A rewrite is kept if replaying the path from where it
+changes scores no worse, which is done in place with a Rollout rather than
+with World copies.
+"""
+import time
+
+import nav
+import rollout
+import world
+
+class _Path(object):
+    """Commands with the world before each of them
+
+    Instance Variables:
+    commands -- the commands, ending the game
+    worlds -- worlds[i] is the world after commands[:i]
+    """
+
+    def __init__(self, w, commands):
+        self.commands = ''
+        self.worlds = [w]
+        self.rollout = rollout.Rollout()
+        self._extend(commands)
+
+    def _extend(self, commands):
+        w = self.worlds[-1]
+        for cmd in commands:
+            if w.is_done() or cmd not in w.valid_moves():
+                raise world.InvalidMove(cmd)
+            w = w.move(cmd)
+            self.worlds.append(w)
+        self.commands += commands
+
+    def score(self):
+        return self.worlds[-1].score()
+
+    def replay(self, i, commands):
+        """Get the score of the game going on with commands after commands[:i].
+
+        None if a command is invalid or the game doesn't end with the last one.
+        """
+        r = self.rollout
+        r.reset(self.worlds[i])
+        moves = r.moves
+        for cmd in commands:
+            n = r.valid_moves()
+            if cmd not in moves[:n]:
+                return None
+            r.step(cmd)
+        if r.state == world.RUNNING:
+            return None
+        return r.score()
+
+    def rewrite(self, i, j, commands):
+        """Replace commands[i:j] by commands if that doesn't cost points"""
+        rest = commands + self.commands[j:]
+        if len(rest) >= len(self.commands) - i:
+            return False
+        score = self.replay(i, rest)
+        if score is None or score < self.score():
+            return False
+        self.commands = self.commands[:i]
+        del self.worlds[i + 1:]
+        self._extend(rest)
+        return True
+
+def _trim(path):
+    """Abort after the best running world instead"""
+    worlds = path.worlds
+    running = [i for i in xrange(len(worlds)) if worlds[i].state == world.RUNNING]
+    if not running:
+        return False
+    best = max(running, key=lambda i: worlds[i].score())
+    return path.rewrite(best, len(path.commands), world.ABORT)
+
+def _checkpoints(path):
+    """Get the indexes of the worlds that picked something up or got into the lift"""
+    points = [0]
+    worlds = path.worlds
+    for i in xrange(1, len(worlds)):
+        before = worlds[i - 1]
+        after = worlds[i]
+        if (after.lambdas_collected != before.lambdas_collected or
+            after.num_razors > before.num_razors or after.in_lift):
+            points.append(i)
+    return points
+
+def _reroute(path, deadline):
+    """Walk each leg between two checkpoints along a nav route"""
+    changed = False
+    points = _checkpoints(path)
+    for a, b in reversed(zip(points, points[1:])):
+        if time.time() > deadline:
+            break
+        if b >= len(path.worlds):
+            continue
+        leg = nav.route(path.worlds[a], path.worlds[b].robot)
+        if leg is not None and path.rewrite(a, b, leg):
+            changed = True
+    return changed
+
+def _delete(path, deadline):
+    """Delete single commands and pairs of them"""
+    changed = False
+    i = len(path.commands) - 1
+    while i >= 0:
+        if time.time() > deadline:
+            break
+        if path.rewrite(i, i + 1, '') or path.rewrite(i, i + 2, ''):
+            changed = True
+        i = min(i, len(path.commands)) - 1
+    return changed
+
+def polish(w, commands, deadline):
+    """Get commands that score at least as well on w, with fewer moves.
+
+    commands have to end the game, as finish_path() gives them.  Stops
+    rewriting at deadline, a time.time().  Returns (commands, points) with
+    the points won back.
+    """
+    try:
+        path = _Path(w, commands)
+    except world.InvalidMove:
+        return commands, 0
+    start = path.score()
+    changed = True
+    while changed and time.time() < deadline:
+        changed = _trim(path)
+        changed = _reroute(path, deadline) or changed
+        changed = _delete(path, deadline) or changed
+    return path.commands, path.score() - start
@@ -0,0 +1,232 @@
+"""Race several searchers on one map and keep the best path any of them finds.
+
+Which searcher does best depends on the kind of map, so the portfolio runs
+a few of them side by side, each as its own process reading the map from
+stdin, all under one deadline.  It picks up their bests from what they
+print and from the solution directory they all share, replays each one,
+and prints the best path just before the deadline.
+
+An entrant can be held back with name@seconds: it then starts that far
+into the race with the best path so far as its --initial-path, e.g.
+`-s nearbot -s uct@20` lets uct carry on from what nearbot found.
+"""
+import Queue
+import optparse
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import replay
+import solutions
+import world
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# what the searchers print when they have a new best
+_BEST_PATTERNS = [
+    re.compile(r'current best (-?\d+) ([UDLRWSA]*)\s*$'),
+    re.compile(r'score (-?\d+)(?: for| path)? \[([UDLRWSA]*)\]'),
+]
+
+def _bot(name):
+    def argv(seconds, path, solutions_directory):
+        return (['bot.py', '-n', name, '--time-based', str(max(1, int(seconds))),
+                 '--initial-path', path, '--solutions', solutions_directory, '/dev/stdin'])
+    return argv
+
+def _timed(script):
+    def argv(seconds, path, solutions_directory):
+        return ([script, '--time', str(seconds), '--initial-path', path,
+                 '--solutions', solutions_directory])
+    return argv
+
+def _tree(seconds, path, solutions_directory):
+    return ['lifter_tree.py', '--initial-path', path, '--solutions', solutions_directory]
+
+def _plain(script):
+    def argv(seconds, path, solutions_directory):
+        return [script]
+    return argv
+
+# name -> argv(seconds, initial path, solutions directory) with the script first
+STRATEGIES = {
+    'nearbot': _bot('nearbot'),
+    'random': _bot('random'),
+    'tour': _bot('tour'),
+    'tree': _tree,
+    'uct': _timed('lifter_uct.py'),
+    'genetic': _timed('lifter_genetic.py'),
+    'swarm': _plain('lifter_swarm.py'),
+    'diver': _plain('lifter_diver.py'),
+    'vectors': _plain('lifter_vectors.py'),
+}
+
+class Entrant(object):
+    """One searcher process in the race
+
+    Instance Variables:
+    name -- the key of its strategy in STRATEGIES
+    delay -- seconds into the race to start it at
+    reported -- the best score it has printed, to skip lines that are no better
+    """
+
+    def __init__(self, spec):
+        name, _, delay = spec.partition('@')
+        if name not in STRATEGIES:
+            raise ValueError('no such strategy: %s' % name)
+        self.name = name
+        self.delay = float(delay or 0)
+        self.process = None
+        self.reported = None
+
+    def start(self, map_text, seconds, path, solutions_directory, lines):
+        """Start the searcher, sending what it prints to the lines queue"""
+        argv = STRATEGIES[self.name](seconds, path, solutions_directory)
+        argv[0] = os.path.join(HERE, argv[0])
+        with open(os.devnull, 'w') as devnull:
+            self.process = subprocess.Popen([sys.executable, '-u'] + argv, cwd=HERE,
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=devnull)
+        self.process.stdin.write(map_text)
+        self.process.stdin.close()
+
+        def read():
+            for line in iter(self.process.stdout.readline, ''):
+                lines.put((self, line))
+        reader = threading.Thread(target=read)
+        reader.daemon = True
+        reader.start()
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.running():
+            self.process.send_signal(signal.SIGINT)
+
+    def kill(self):
+        if self.running():
+            self.process.kill()
+
+class Race(object):
+    """The entrants and the best path any of them found
+
+    Instance Variables:
+    best_score -- the score of best_commands, which end the game
+    best_commands -- the best path so far
+    """
+
+    def __init__(self, initial_world, entrants, store=None):
+        self.world = initial_world
+        self.entrants = entrants
+        self.store = store
+        self.best_score = None
+        self.best_commands = None
+
+    def offer(self, source, commands):
+        """Keep commands if they beat the best, returning True if they did"""
+        end = replay.play(self.world, commands)
+        if end is None:
+            return False
+        if not end.is_done():
+            end = end.move(world.ABORT)
+            commands += world.ABORT
+        score = end.score()
+        if self.best_score is not None and score <= self.best_score:
+            return False
+        self.best_score = score
+        self.best_commands = commands
+        print >>sys.stderr, 'NEWBEST %d from %s' % (score, source)
+        return True
+
+    def read(self, entrant, line):
+        for pattern in _BEST_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                score = int(match.group(1))
+                if entrant.reported is None or score > entrant.reported:
+                    entrant.reported = score
+                    self.offer(entrant.name, match.group(2))
+                return
+        line = line.strip()
+        if line and not line.strip('UDLRWSA'):
+            # the path searchers print last
+            self.offer(entrant.name, line)
+
+    def run(self, map_text, seconds, margin, solutions_directory):
+        """Race the entrants for seconds.
+
+        They are told to be done margin seconds early, then interrupted, and
+        get half of the margin to print their last words.
+        """
+        start = time.time()
+        finish = start + seconds - margin
+        lines = Queue.Queue()
+        waiting = sorted(self.entrants, key=lambda e: e.delay)
+        upper_bound = self.world.upper_bound()
+        last_poll = start
+        try:
+            while time.time() < finish and (self.best_score is None or self.best_score < upper_bound):
+                now = time.time()
+                while waiting and waiting[0].delay <= now - start:
+                    path = (self.best_commands or '').rstrip(world.ABORT)
+                    waiting.pop(0).start(map_text, finish - now, path, solutions_directory, lines)
+                if self.store is not None and now - last_poll >= 1.0:
+                    # bests of searchers that only write them down
+                    last_poll = now
+                    cached = self.store.get(self.world)
+                    if cached is not None:
+                        self.offer('solutions', cached[1])
+                if not waiting and not any(e.running() for e in self.entrants) and lines.empty():
+                    break
+                try:
+                    entrant, line = lines.get(timeout=max(0.01, min(0.2, finish - now)))
+                except Queue.Empty:
+                    continue
+                self.read(entrant, line)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for e in self.entrants:
+                e.stop()
+            # let them print their last words
+            end = time.time() + margin / 2.0
+            while time.time() < end:
+                try:
+                    entrant, line = lines.get(timeout=0.05)
+                except Queue.Empty:
+                    if not any(e.running() for e in self.entrants):
+                        break
+                    continue
+                self.read(entrant, line)
+            for e in self.entrants:
+                e.kill()
+        return self.best_commands
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage='%prog [options] [map]')
+    parser.add_option('--strategy', '-s', dest='strategies', action='append', default=[],
+                      help='searcher to race, as name or name@seconds, may be repeated (%s)' %
+                      ', '.join(sorted(STRATEGIES)))
+    parser.add_option('--time', default=150, type='float',
+                      help='seconds until the best path has to be printed')
+    parser.add_option('--margin', default=2.0, type='float',
+                      help='seconds before the deadline to stop the searchers at')
+    parser.add_option('--solutions', default=solutions.DEFAULT_DIRECTORY,
+                      help='directory of best known solutions for the searchers to share, empty for none')
+    opts, args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    map_text = ''.join(open(args[0]).readlines() if args else sys.stdin.readlines())
+    initial_world = world.parse_world(map_text.splitlines())
+    store = None
+    if opts.solutions:
+        store = solutions.SolutionStore(opts.solutions)
+    entrants = [Entrant(spec) for spec in opts.strategies or ['nearbot', 'uct', 'genetic']]
+    race = Race(initial_world, entrants, store)
+    commands = race.run(map_text, opts.time, opts.margin, opts.solutions)
+    print commands or world.ABORT
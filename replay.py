@@ -0,0 +1,63 @@
+"""Replaying many command strings that start out the same.
+
+Searchers that change move strings here and there (polishing, local and
+genetic search) evaluate each new string by playing it from the start of
+the map, although most of it is the same as a string played just before.
+A ReplayCache keeps the World every `interval` commands along the strings
+it has played, keyed by the commands that lead there, and starts each new
+string from the longest prefix it has a World for.
+"""
+import util
+
+def play(w, commands):
+    """Play commands on w, returning the last world or None if one is invalid"""
+    for cmd in commands:
+        if w.is_done() or cmd not in w.valid_moves():
+            return None
+        w = w.move(cmd)
+    return w
+
+class ReplayCache(object):
+    """World checkpoints along recently played command strings
+
+    Instance Variables:
+    root -- the world every string is played from
+    interval -- commands between two checkpoints
+    checkpoints -- LRUCache from a prefix of commands to the world after it
+    played -- how many moves were made, for seeing how much the cache saves
+    """
+
+    def __init__(self, root, interval=16, capacity=4096):
+        assert interval > 0
+        self.root = root
+        self.interval = interval
+        self.checkpoints = util.LRUCache(capacity)
+        self.played = 0
+
+    def _resume(self, commands):
+        """Get (length, world) for the longest prefix of commands with a checkpoint"""
+        checkpoints = self.checkpoints
+        k = len(commands) - len(commands) % self.interval
+        while k > 0:
+            w = checkpoints.get(commands[:k])
+            if w is not None:
+                return k, w
+            k -= self.interval
+        return 0, self.root
+
+    def world(self, commands):
+        """Get the world after playing commands on root.
+
+        Returns None if a command is invalid or comes after the game ended.
+        """
+        k, w = self._resume(commands)
+        interval = self.interval
+        for i in xrange(k, len(commands)):
+            cmd = commands[i]
+            if w.is_done() or cmd not in w.valid_moves():
+                return None
+            w = w.move(cmd)
+            self.played += 1
+            if (i + 1) % interval == 0:
+                self.checkpoints.put(commands[:i + 1], w)
+        return w
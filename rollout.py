@@ -0,0 +1,296 @@
+"""In-place playouts for the Monte Carlo searchers.
+
+World.move() copies the whole world on every step, which is what you want
+inside a search tree but pure waste in a playout, where only the final score
+matters.  A Rollout loads a World once into flat scratch buffers and then
+plays moves in place, following the same rules as World.move().
+"""
+import random
+
+import world
+
+_ROBOT = ord(world.ROBOT)
+_WALL = ord(world.WALL)
+_LAMBDA = ord(world.LAMBDA)
+_ROCK = ord(world.ROCK)
+_CLOSED = ord(world.CLOSED)
+_OPEN = ord(world.OPEN)
+_EARTH = ord(world.EARTH)
+_EMPTY = ord(world.EMPTY)
+_BEARD = ord(world.BEARD)
+_RAZOR = ord(world.RAZOR)
+_TRAMPOLINES = frozenset(ord(c) for c in world.TRAMPOLINES)
+_TARGETS = frozenset(ord(c) for c in world.TARGETS)
+
+class Rollout(object):
+    """A mutable scratch copy of a World for fast playouts
+
+    Call reset() with a World, then play() or step().  The buffers are
+    reused across resets of worlds with the same map size, and step()
+    updates the rock and beard lists in place.
+
+    Instance Variables:
+    cells -- bytearray of map symbols indexed by y*width + x
+    history -- bytearray of the commands played since reset()
+    positions -- the robot's cell index before each command in .history
+    rocks, beards -- cell indexes of the rocks and beards, in no order
+    """
+
+    def __init__(self, max_depth=100):
+        self.max_depth = max_depth
+        self.width = 0
+        self.height = 0
+        self.cells = bytearray()
+        self.scratch = bytearray()
+        self.history = bytearray(max_depth + 2)
+        self.positions = [0] * (max_depth + 2)
+        self.moves = [None] * 7
+        self.rocks = []
+        self.beards = []
+
+    def reset(self, w):
+        width, height = w.size()
+        size = width * height
+        if len(self.cells) != size:
+            self.cells = bytearray(size)
+            self.scratch = bytearray(size)
+        self.width = width
+        self.height = height
+        self.cells[:] = ''.join(''.join(row) for row in w.map)
+        rx, ry = w.robot
+        self.robot = ry * width + rx
+        lx, ly = w.lift
+        self.lift = ly * width + lx
+        self.rocks[:] = [y * width + x for x, y in w.rocks]
+        self.beards[:] = [y * width + x for x, y in w.beards]
+        self.beard_growth = w.beard_growth
+        self.trampolines = dict(((y * width + x), ty * width + tx)
+                                for (x, y), (tx, ty) in w.trampolines.iteritems())
+        self.remaining_lambdas = w.remaining_lambdas
+        self.lambdas_collected = w.lambdas_collected
+        self.num_moves = w.num_moves
+        self.num_razors = w.num_razors
+        self.water = w.water
+        self.flooding = w.flooding
+        self.waterproof = w.waterproof
+        self.underwater = w.underwater
+        self.in_lift = w.in_lift
+        self.state = w.state
+        self.length = 0
+
+    def score(self):
+        state = self.state
+        if state == world.REACHED_LIFT:
+            mult = 3
+        elif state == world.ABORTED or state == world.RUNNING:
+            mult = 2
+        else:
+            mult = 1
+        return (25*self.lambdas_collected*mult) - self.num_moves
+
+    def valid_moves(self):
+        """Fill .moves with the valid commands and return how many there are.
+
+        The order matches World.valid_moves().
+        """
+        moves = self.moves
+        if self.state != world.RUNNING:
+            return 0
+        moves[0] = world.ABORT
+        moves[1] = world.WAIT
+        n = 2
+        cells = self.cells
+        width = self.width
+        robot = self.robot
+        rx = robot % width
+        ry = robot // width
+        if self.num_razors > 0 and self.beards:
+            for b in self.beards:
+                if abs(b % width - rx) <= 1 and abs(b // width - ry) <= 1:
+                    moves[n] = world.SHAVE
+                    n += 1
+                    break
+        for move, dx, dy in ((world.UP, 0, 1), (world.DOWN, 0, -1), (world.LEFT, -1, 0), (world.RIGHT, 1, 0)):
+            x = rx + dx
+            y = ry + dy
+            if x < 0 or y < 0 or y >= self.height or x >= width:
+                continue
+            at = cells[y * width + x]
+            if at == _WALL or at == _CLOSED or at == _BEARD or at in _TARGETS:
+                continue
+            if at == _ROCK:
+                if dy != 0:
+                    continue
+                x += dx
+                if x < 0 or x >= width:
+                    continue
+                if cells[y * width + x] != _EMPTY:
+                    continue
+            moves[n] = move
+            n += 1
+        return n
+
+    def step(self, cmd):
+        """Play one valid command in place, like World.move()"""
+        if self.length == len(self.history):
+            self.history.extend(self.history)
+            self.positions.extend(self.positions)
+        orig = robot = self.robot
+        self.history[self.length] = cmd
+        self.positions[self.length] = robot
+        self.length += 1
+        cells = self.cells
+        width = self.width
+
+        # move the robot
+        d = 0
+        if cmd == world.UP:
+            d = width
+        elif cmd == world.DOWN:
+            d = -width
+        elif cmd == world.LEFT:
+            d = -1
+        elif cmd == world.RIGHT:
+            d = 1
+        elif cmd == world.SHAVE and self.num_razors > 0:
+            rx = robot % width
+            ry = robot // width
+            beards = self.beards
+            for k in xrange(len(beards) - 1, -1, -1):
+                b = beards[k]
+                if abs(b % width - rx) <= 1 and abs(b // width - ry) <= 1:
+                    cells[b] = _EMPTY
+                    del beards[k]
+            self.num_razors -= 1
+        robot += d
+        symbol = cells[robot]
+        if symbol == _ROCK:
+            rock = robot + d
+            rocks = self.rocks
+            rocks[rocks.index(robot)] = rock
+            cells[rock] = _ROCK
+            cells[robot] = _EMPTY
+        elif symbol == _LAMBDA:
+            self.remaining_lambdas -= 1
+            self.lambdas_collected += 1
+        elif symbol == _OPEN:
+            self.in_lift = True
+        elif symbol == _RAZOR:
+            self.num_razors += 1
+        elif symbol in _TRAMPOLINES:
+            target = self.trampolines[robot]
+            for src, dst in self.trampolines.items():
+                if dst == target:
+                    del self.trampolines[src]
+                    cells[src] = _EMPTY
+            robot = target
+        cells[orig] = _EMPTY
+        cells[robot] = _ROBOT
+        self.robot = robot
+
+        # update the world, reading from cells and writing to scratch
+        write = self.scratch
+        write[:] = cells
+        killer = robot + width
+        killed = False
+        rocks = self.rocks
+        if rocks:
+            merged = 0
+            for k in xrange(len(rocks)):
+                i = rocks[k]
+                below = cells[i - width]
+                if below == _EMPTY:
+                    dest = i - width
+                elif below == _ROCK and cells[i + 1] == _EMPTY and cells[i - width + 1] == _EMPTY:
+                    dest = i - width + 1
+                elif below == _ROCK and cells[i - 1] == _EMPTY and cells[i - width - 1] == _EMPTY:
+                    dest = i - width - 1
+                elif below == _LAMBDA and cells[i + 1] == _EMPTY and cells[i - width + 1] == _EMPTY:
+                    dest = i - width + 1
+                else:
+                    continue
+                # rocks only fall into empty cells, so dest held no rock
+                # before this step, and one there now fell there too
+                if write[dest] == _ROCK:
+                    rocks[k] = -1
+                    merged += 1
+                else:
+                    rocks[k] = dest
+                write[dest] = _ROCK
+                write[i] = _EMPTY
+                if dest == killer:
+                    killed = True
+            while merged:
+                rocks.remove(-1)
+                merged -= 1
+        if self.beards and (self.beard_growth <= 1 or (self.num_moves + 1) % self.beard_growth == 0):
+            self._grow_beards(cells, write)
+        if cells[self.lift] == _CLOSED and self.remaining_lambdas == 0:
+            write[self.lift] = _OPEN
+        self.cells = write
+        self.scratch = cells
+
+        # check for the end
+        if cmd == world.ABORT:
+            self.state = world.ABORTED
+            self.num_moves += 1
+            return
+        if robot // width <= self.water:
+            self.underwater += 1
+        else:
+            self.underwater = 0
+        if self.flooding > 0 and self.num_moves > 0 and (self.num_moves % self.flooding) == 0:
+            self.water += 1
+        if killed:
+            self.state = world.KILLED
+        elif self.underwater > 0 and self.underwater > self.waterproof:
+            self.state = world.FLOODED
+        elif self.in_lift:
+            self.state = world.REACHED_LIFT
+        self.num_moves += 1
+
+    def _grow_beards(self, read, write):
+        width = self.width
+        height = self.height
+        beards = self.beards
+        # the new beards go on the end and don't grow until next time
+        for k in xrange(len(beards)):
+            b = beards[k]
+            x = b % width
+            y = b // width
+            for dx, dy in world.all_dirs:
+                bx = x + dx
+                by = y + dy
+                if bx < 0 or by < 0 or bx >= width or by >= height:
+                    continue
+                n = by * width + bx
+                if read[n] == _EMPTY and write[n] == _EMPTY:
+                    write[n] = _BEARD
+                    beards.append(n)
+
+    def play(self, max_depth=None):
+        """Play random valid moves until the game ends.
+
+        After max_depth moves the robot aborts.  Returns (score, length)
+        where length is the number of commands in .history.
+        """
+        if max_depth is None:
+            max_depth = self.max_depth
+        if len(self.history) < max_depth + 2:
+            self.history = bytearray(max_depth + 2)
+            self.positions = [0] * (max_depth + 2)
+        moves = self.moves
+        rand = random.random
+        depth = 0
+        while self.state == world.RUNNING:
+            if depth > max_depth:
+                self.step(world.ABORT)
+                break
+            n = self.valid_moves()
+            self.step(moves[int(rand() * n)])
+            depth += 1
+        return self.score(), self.length
+
+    def commands(self):
+        """Get the commands played since reset() as a string"""
+        return str(self.history[:self.length])
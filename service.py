@@ -0,0 +1,189 @@
+"""Solve many maps in one process.
+
+Every run of `lifter` pays for starting Python, importing everything and
+working out the distances of its map before it searches at all.  The
+service stays up and takes one request per line, as JSON:
+
+    {"map": "<map text>", "time": 10, "searcher": "nearbot", "id": 7}
+
+"file" can name a map file instead of giving "map".  Each answer is one
+line of JSON with the id, the commands, their score and the seconds taken,
+or an "error".  Requests come from stdin, or from the connections to a
+unix socket with --socket.  Parsed maps and everything they worked out
+(static distances, the flood timeline, the upper bound) stay around for
+the next request with the same map, as do the solutions on disk.
+"""
+import SocketServer
+import json
+import logging
+import optparse
+import os
+import sys
+import time
+
+import bot
+import lifter_genetic
+import lifter_uct
+import polish
+import replay
+import solutions
+import util
+import world
+
+log = logging.getLogger('service')
+
+def _run_bot(name):
+    def search(w, seed, deadline, store):
+        best = bot.run_bot(bot.bot_for_name(name), w, -1,
+                           initial_path=None, tour_seed=True,
+                           solution_store=store, deadline=deadline)
+        return bot.finish_path(best)
+    return search
+
+def _run_uct(w, seed, deadline, store):
+    search = lifter_uct.UCTSearch(w)
+    if seed:
+        search.seed(w, seed)
+    while not search.exhausted and time.time() < deadline:
+        search.iterate()
+    return search.best_commands
+
+def _run_genetic(w, seed, deadline, store):
+    lifter_genetic._init(w, 100)
+    search = lifter_genetic.Evolution()
+    seeds = [seed] if seed else []
+    search.start(seeds)
+    while time.time() < deadline:
+        search.step()
+    return search.best_commands
+
+SEARCHERS = {
+    'uct': _run_uct,
+    'genetic': _run_genetic,
+}
+
+def searcher(name):
+    """Get the search function called name: a bot, uct or genetic"""
+    if name in SEARCHERS:
+        return SEARCHERS[name]
+    bot.bot_for_name(name) # raises AttributeError for no such bot
+    return _run_bot(name)
+
+class Service(object):
+    """Answers solve requests, keeping what it learns about maps
+
+    Instance Variables:
+    worlds -- LRUCache from map text to the World read from it
+    store -- the solutions.SolutionStore, or None
+    """
+
+    def __init__(self, store=None, capacity=64, polish_seconds=1.0):
+        self.worlds = util.LRUCache(capacity)
+        self.store = store
+        self.polish_seconds = polish_seconds
+
+    def world(self, text):
+        """Get the World of a map, read once and warmed up"""
+        w = self.worlds.get(text)
+        if w is None:
+            w = world.parse_world(text.splitlines())
+            # work these out on the world every search is copied from
+            w.static_distances()
+            w.flood_timeline()
+            w.upper_bound()
+            self.worlds.put(text, w)
+        return w
+
+    def solve(self, text, seconds, name='nearbot'):
+        """Get (commands, score, cached) for a map, searching for about seconds"""
+        w = self.world(text)
+        search = searcher(name)
+        seed = None
+        if self.store is not None:
+            cached = self.store.get(w)
+            if cached is not None:
+                cached_score, seed = cached
+                if cached_score >= w.upper_bound():
+                    return seed, cached_score, True
+        start = time.time()
+        polish_seconds = min(self.polish_seconds, seconds / 2.0)
+        commands = search(w, seed, start + seconds - polish_seconds, self.store)
+        if not commands:
+            commands = world.ABORT
+        commands, _ = polish.polish(w, commands, time.time() + polish_seconds)
+        score = replay.play(w, commands).score()
+        if seed is not None and score < cached_score:
+            # the searcher lost track of the cached path
+            return seed, cached_score, True
+        if self.store is not None:
+            self.store.put(w, commands, score)
+        return commands, score, False
+
+    def handle(self, line):
+        """Answer one request line with one line of JSON"""
+        start = time.time()
+        answer = {}
+        try:
+            request = json.loads(line)
+            answer['id'] = request.get('id')
+            if 'map' in request:
+                text = request['map']
+            else:
+                with open(request['file']) as f:
+                    text = f.read()
+            commands, score, cached = self.solve(str(text),
+                                                 float(request.get('time', 10)),
+                                                 str(request.get('searcher', 'nearbot')))
+            answer.update(commands=commands, score=score, cached=cached)
+        except Exception, e:
+            log.exception('request failed: %r', line)
+            answer['error'] = '%s: %s' % (type(e).__name__, e)
+        answer['seconds'] = round(time.time() - start, 3)
+        return json.dumps(answer)
+
+    def serve_lines(self, infile, outfile):
+        for line in iter(infile.readline, ''):
+            if line.strip():
+                outfile.write(self.handle(line) + '\n')
+                outfile.flush()
+
+class _Handler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        self.server.service.serve_lines(self.rfile, self.wfile)
+
+def serve_socket(service, path):
+    """Answer the requests of one connection after another on a unix socket"""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = SocketServer.UnixStreamServer(path, _Handler)
+    server.service = service
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser()
+    parser.add_option('--socket', default='',
+                      help='unix socket to take requests on, instead of stdin')
+    parser.add_option('--solutions', default=solutions.DEFAULT_DIRECTORY,
+                      help='directory of best known solutions to start from and add to, empty for none')
+    parser.add_option('--polish', default=1.0, type='float',
+                      help='seconds of each time budget kept for polishing the best path, 0 to not polish')
+    parser.add_option('--maps', default=64, type='int',
+                      help='maps to keep read and worked out between requests')
+    opts, args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    store = None
+    if opts.solutions:
+        store = solutions.SolutionStore(opts.solutions)
+    service = Service(store, opts.maps, opts.polish)
+    try:
+        if opts.socket:
+            serve_socket(service, opts.socket)
+        else:
+            service.serve_lines(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,86 @@
+"""The best known solution of every map, kept on disk between runs.
+
+Each map gets one small JSON file named by World.map_hash(), with the best
+score found so far and the commands for it.  Stored commands are replayed
+before they're trusted, and a write goes through a temporary file and a
+rename, so searchers running side by side can share a directory.  The
+directory is ./solutions next to the code unless LIFTER_SOLUTIONS says
+otherwise.
+"""
+import json
+import logging
+import os
+import tempfile
+
+import replay
+
+log = logging.getLogger('solutions')
+
+DEFAULT_DIRECTORY = os.environ.get('LIFTER_SOLUTIONS') or \
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solutions')
+
+class SolutionStore(object):
+    """Best known (score, commands) per map
+
+    Instance Variables:
+    directory -- where the files go, made when first written to
+    known -- maps a map hash to the best score this store has seen for it
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.known = {}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+            return int(entry['score']), str(entry['commands'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def get(self, w):
+        """Get (score, commands) for the map of w, or None.
+
+        w has to be the world as read from the map.
+        """
+        key = w.map_hash()
+        entry = self._load(key)
+        if entry is None:
+            return None
+        score, commands = entry
+        end = replay.play(w, commands)
+        if end is None or end.score() != score:
+            log.warning('ignoring stale solution %s', self._path(key))
+            return None
+        self.known[key] = max(score, self.known.get(key, score))
+        return score, commands
+
+    def put(self, w, commands, score):
+        """Keep commands for the map of w if they beat what is stored.
+
+        Returns True if they were written.
+        """
+        key = w.map_hash()
+        if key in self.known and score <= self.known[key]:
+            return False
+        # another searcher may have written since we last looked
+        entry = self._load(key)
+        if entry is not None and entry[0] >= score:
+            self.known[key] = entry[0]
+            return False
+        self.known[key] = score
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'score': score, 'commands': str(commands)}, f)
+            os.rename(tmp, self._path(key))
+        except (IOError, OSError), e:
+            log.warning('could not store a solution: %s', e)
+            return False
+        return True
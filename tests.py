@@ -1,5 +1,28 @@
+import itertools
+import StringIO
+import json
+import shutil
+import sys
+import tempfile
+import time
 import unittest
+import distances
+import lifter_genetic
+import lifter_uct
+import macros
+import nav
+import nodepool
+import paths
+import polish
+import portfolio
+import random
+import replay
+import rollout
+import service
+import solutions
+import tour
 import util
+import world
 
 class TestSegments(unittest.TestCase):
     def test(self):
@@ -23,6 +46,581 @@ class TestMax(unittest.TestCase):
         self.assertEquals(m.score, 4)
         self.assertEquals(m.key, 't')
 
+class TestLRUCache(unittest.TestCase):
+    def test(self):
+        c = util.LRUCache(2)
+        c.put('a', 1)
+        c.put('b', 2)
+        self.assertEquals(c.get('a'), 1)
+        c.put('c', 3)
+        self.assertEquals(c.get('b'), None)
+        self.assertEquals(c.get('a'), 1)
+        self.assertEquals(len(c), 2)
+        c.resize(1)
+        self.assertEquals(c.get('c'), None)
+        self.assertTrue('a' in c)
+
+class TestPrefixCommitter(unittest.TestCase):
+    def test(self):
+        now = [0]
+        c = util.PrefixCommitter(2, 5, clock=lambda: now[0])
+        c.update('L')
+        now[0] = 10
+        self.assertEquals(c.ready(), None)
+        c.update('LRU')
+        now[0] = 14
+        c.update('LRD')
+        self.assertEquals(c.ready(), None)
+        now[0] = 15
+        self.assertEquals(c.ready(), 'LR')
+        c.accept('LR')
+        c.update('LRDD')
+        self.assertEquals(c.ready(), None)
+        now[0] = 20
+        self.assertEquals(c.ready(), 'LRDD')
+        c.accept('LRDD')
+
+    def test_failed_commit(self):
+        now = [0]
+        c = util.PrefixCommitter(2, 5, clock=lambda: now[0])
+        c.update('UURR')
+        now[0] = 5
+        self.assertEquals(c.ready(), 'UU')
+        # the searcher couldn't commit, so a path that leaves it is fine
+        c.update('UDWR')
+        self.assertEquals(c.committed, '')
+        self.assertEquals(c.ready(), None)
+        now[0] = 10
+        self.assertEquals(c.ready(), 'UD')
+
+class TestNodePool(unittest.TestCase):
+    def test(self):
+        w = world.read_world(['maps/contest1.map'])
+        pool = nodepool.NodePool()
+        root = pool.add(nodepool.NO_NODE, None, w, w.valid_moves())
+        self.assertEquals(sorted(pool.unexplored_commands(root)), sorted(w.valid_moves()))
+        cmd = pool.pop_unexplored(root)
+        self.assertFalse(cmd in pool.unexplored_commands(root))
+        child_world = w.move(cmd)
+        child = pool.add(root, cmd, child_world, child_world.valid_moves())
+        self.assertEquals(pool.child(root, cmd), child)
+        self.assertEquals(pool.child_ids(root), [child])
+        self.assertEquals(pool.path(child), cmd)
+        self.assertTrue(pool.world(child) is child_world)
+
+    def test_dominate(self):
+        w = world.read_world(['maps/contest1.map'])
+        pool = nodepool.NodePool()
+        root = pool.add(nodepool.NO_NODE, None, w, '')
+        a = pool.add(root, 'L', w, '')
+        b = pool.add(a, 'D', w, '')
+        c = pool.add(root, 'R', w, '')
+        self.assertFalse(pool.is_dominated(b))
+        pool.dominate(a)
+        self.assertTrue(pool.is_dominated(b))
+        self.assertFalse(pool.is_dominated(c))
+        self.assertFalse(pool.is_dominated(root))
+        # children found later are dominated too
+        self.assertTrue(pool.is_dominated(pool.add(b, 'R', w, '')))
+        self.assertFalse(pool.is_dominated(pool.add(c, 'R', w, '')))
+
+    def test_reroot(self):
+        w = world.read_world(['maps/contest1.map'])
+        pool = nodepool.NodePool()
+        root = pool.add(nodepool.NO_NODE, None, w, '')
+        a = pool.add(root, 'L', w, '')
+        b = pool.add(a, 'D', w, '')
+        c = pool.add(root, 'R', w, '')
+        d = pool.add(b, 'W', w, '')
+        mapping = pool.reroot(a)
+        self.assertEquals(len(pool), 3)
+        self.assertFalse(c in mapping)
+        self.assertEquals(mapping[a], nodepool.ROOT)
+        self.assertEquals(pool.child(nodepool.ROOT, 'D'), mapping[b])
+        self.assertEquals(pool.path(mapping[d]), 'DW')
+
+    def test_world_store(self):
+        w = world.read_world(['maps/contest1.map'])
+        pool = nodepool.NodePool()
+        # room for 4 checkpoints and 4 cached worlds
+        store = nodepool.WorldStore(pool, memory_budget=8, world_bytes=1)
+        nodes = [pool.add(nodepool.NO_NODE, None, w, '')]
+        worlds = [w]
+        for cmd in 'LDRDDUULLLDDL':
+            worlds.append(worlds[-1].move(cmd))
+            nodes.append(pool.add(nodes[-1], cmd, worlds[-1], ''))
+        self.assertTrue(store.interval > 1)
+        self.assertTrue(len(store.checkpoints) <= 4)
+        rebuilt = [n for n in nodes if pool.worlds[n] is None and n not in store.cache]
+        self.assertTrue(rebuilt)
+        for n in rebuilt:
+            self.assertEquals(store.world(n).key(), worlds[n].key())
+            self.assertEquals(store.world(n).score(), worlds[n].score())
+        self.assertTrue(store.replayed > 0)
+
+    def test_world_store_slowdown(self):
+        store = nodepool.WorldStore(nodepool.NodePool(), interval=8, max_slowdown=2.0)
+        store.iterations = store.window - 1
+        store.replayed = store.window # 2 moves an iteration is still fine
+        store.tick()
+        self.assertEquals(store.interval, 8)
+        store.iterations = store.window - 1
+        store.replayed = 3 * store.window
+        store.tick()
+        self.assertEquals(store.interval, 4)
+
+class TestMacros(unittest.TestCase):
+    def test(self):
+        w = world.read_world(['maps/beard4.map'])
+        commands, after = macros.tunnel_macro(w, 'R')
+        self.assertEquals(commands, 'RD')
+        self.assertEquals(after.path, 'RD')
+        self.assertEquals(macros.tunnel_macro(w, 'W'), None)
+
+        pool = nodepool.NodePool()
+        root = pool.add(nodepool.NO_NODE, None, w, '')
+        pool.set_macro(root, commands)
+        child = pool.add(root, 'R', after, '')
+        self.assertEquals(pool.path(child), 'RD')
+        self.assertEquals(pool.find(root, 'RD'), child)
+        self.assertEquals(pool.find(root, 'R'), nodepool.NO_NODE)
+
+class TestPath(unittest.TestCase):
+    def test(self):
+        p = paths.EMPTY + 'LR'
+        q = p + 'U'
+        self.assertEquals(str(q), 'LRU')
+        self.assertEquals(len(q), 3)
+        self.assertTrue(q.parent is p)
+        self.assertEquals(q, paths.as_path('LRU'))
+        self.assertEquals(q, 'LRU')
+        self.assertNotEquals(q, p + 'D')
+        self.assertEquals(q.last(), 'U')
+        self.assertFalse(paths.EMPTY)
+
+class TestRandomSet(unittest.TestCase):
+    def test(self):
+        s = util.RandomSet()
+        for i in range(5):
+            s.add(i)
+        s.discard(1)
+        s.discard(4)
+        s.discard(7)
+        self.assertEquals(len(s), 3)
+        self.assertEquals(sorted(s.items), [0, 2, 3])
+        self.assertTrue(s.choice() in (0, 2, 3))
+        self.assertFalse(1 in s)
+
+class TestIndexedHeap(unittest.TestCase):
+    def test(self):
+        h = util.IndexedHeap()
+        for key, priority in [('a', 3), ('b', 9), ('c', 1), ('d', 5), ('e', 7)]:
+            h.push(key, priority)
+        self.assertEquals(h.peek(), 'b')
+        h.discard('e')
+        h.push('c', 8)
+        self.assertEquals([h.pop() for _ in range(len(h))], ['b', 'c', 'd', 'a'])
+
+class TestWorldKey(unittest.TestCase):
+    def test(self):
+        w = world.read_world(['maps/contest2.map'])
+        udw = w.move('U').move('D').move('W')
+        self.assertEquals(udw.key(), w.move('W').move('U').move('D').key())
+        self.assertNotEquals(udw.key(), w.key())
+        # the move count is not part of the key
+        self.assertEquals(w.move('W').key(), w.key())
+
+class TestUpperBound(unittest.TestCase):
+    def test_admissible(self):
+        rng = random.Random(0)
+        for map_name in ['contest1', 'contest2', 'trampoline1', 'flood1', 'beard1']:
+            for _ in xrange(5):
+                worlds = [world.read_world(['maps/%s.map' % map_name])]
+                while not worlds[-1].is_done() and len(worlds) < 200:
+                    worlds.append(worlds[-1].move(rng.choice(worlds[-1].valid_moves())))
+                best = None
+                for w in reversed(worlds):
+                    best = max(best, w.score())
+                    self.assertTrue(w.upper_bound() >= best)
+
+    def test_frozen(self):
+        rng = random.Random(0)
+        for map_name in ['flood1', 'contest9', 'beard5']:
+            w = world.read_world(['maps/%s.map' % map_name])
+            frozen = w.frozen_rocks()
+            self.assertTrue(frozen)
+            for _ in xrange(200):
+                if w.is_done():
+                    break
+                w = w.move(rng.choice(w.valid_moves()))
+                self.assertTrue(frozen <= w.frozen_rocks() <= set(w.rocks))
+                frozen = w.frozen_rocks()
+
+    def test_solution(self):
+        w = world.read_world(['maps/contest1.map'])
+        self.assertFalse(w.is_dead())
+        bound = w.upper_bound()
+        for cmd in 'LDRDDUULLLDDL':
+            w = w.move(cmd)
+        self.assertEquals(w.upper_bound(), w.score())
+        self.assertTrue(bound >= w.score())
+
+class TestUsefulMoves(unittest.TestCase):
+    def test_settled(self):
+        rng = random.Random(0)
+        for map_name in ['contest2', 'contest5', 'contest9']:
+            prev = None
+            w = world.read_world(['maps/%s.map' % map_name])
+            for _ in xrange(100):
+                if w.is_done():
+                    break
+                fresh = w.copy()
+                fresh._settled = None
+                self.assertEquals(w.is_settled(), fresh.is_settled())
+                useful = w.useful_moves()
+                for cmd in w.valid_moves():
+                    if cmd not in useful:
+                        # a pruned move leads back to a map we've already had
+                        before = w if cmd == world.WAIT else prev
+                        self.assertEquals(w.move(cmd).key()[0], before.key()[0])
+                prev, w = w, w.move(rng.choice(w.valid_moves().replace('A', '')))
+
+    def test_reversal(self):
+        w = world.read_world(['maps/contest1.map'])
+        self.assertTrue(w.is_settled())
+        self.assertFalse('W' in w.useful_moves())
+        w = w.move('D')
+        self.assertTrue('U' in w.useful_moves()) # dug the earth
+        w = w.move('U')
+        self.assertTrue(w.quiet)
+        self.assertFalse('D' in w.useful_moves())
+
+class TestWalkingDistances(unittest.TestCase):
+    def test_repair(self):
+        rng = random.Random(0)
+        for map_name in ['contest2', 'contest6', 'beard1', 'flood1']:
+            w = world.read_world(['maps/%s.map' % map_name])
+            w.lift_distance()
+            w.lambda_distance()
+            for _ in xrange(100):
+                if w.is_done():
+                    break
+                w = w.move(rng.choice(w.valid_moves().replace('A', '')))
+                for name in ('lift', 'lambdas'):
+                    repaired = w.walking_distances().field(w, name)
+                    fresh = distances.DistanceField(w, w.walking_distances().goals(w, name))
+                    self.assertEquals(repaired.dist, fresh.dist)
+
+    def test_lazy_repair(self):
+        # fields asked for every few moves are repaired over all the changes since
+        rng = random.Random(1)
+        for map_name in ['contest6', 'beard1', 'flood1', 'trampoline1', 'trampoline3']:
+            w = world.read_world(['maps/%s.map' % map_name])
+            for step in xrange(150):
+                if w.is_done():
+                    break
+                if step % 7 == 0:
+                    walking = w.walking_distances()
+                    for name in ['lambdas'] + sorted(w.lambdas):
+                        fresh = distances.DistanceField(w, walking.goals(w, name))
+                        self.assertEquals(walking.field(w, name).dist, fresh.dist)
+                w = w.move(rng.choice(w.valid_moves().replace('A', '')))
+
+    def test_nearest(self):
+        w = world.read_world(['maps/contest1.map'])
+        pos, d = w.nearest_lambda()
+        self.assertEquals(d, w.lambda_distance())
+        self.assertTrue(pos in w.lambdas)
+        self.assertEquals(w.lift_distance(w.lift), 0)
+
+class TestFlood(unittest.TestCase):
+    def test_level(self):
+        w = world.read_world(['maps/flood1.map'])
+        self.assertEquals(w.flooding, 8) # the map has a trailing space there
+        timeline = w.flood_timeline()
+        while w.num_moves < 40:
+            self.assertEquals(timeline.level(w.num_moves), w.water)
+            w = w.move(world.WAIT)
+
+    def test_deadlines(self):
+        rng = random.Random(0)
+        for map_name in ['flood2', 'flood5']:
+            for _ in xrange(10):
+                w = world.read_world(['maps/%s.map' % map_name])
+                timeline = w.flood_timeline()
+                while not w.is_done():
+                    w = w.move(rng.choice(w.valid_moves().replace('A', '')))
+                    if w.state != world.FLOODED:
+                        self.assertTrue(timeline.survivable(w.robot, w.num_moves))
+
+class TestNav(unittest.TestCase):
+    def test_trampolines(self):
+        w = world.read_world(['maps/trampoline1.map'])
+        commands = nav.route(w, (12, 2))
+        for cmd in commands:
+            self.assertTrue(cmd in w.valid_moves())
+            w = w.move(cmd)
+        self.assertEquals(w.robot, (12, 2))
+        # both trampolines to 1 are gone, from the map too
+        self.assertEquals(w.trampolines.values(), [(5, 2)])
+        self.assertFalse(set('AB') & set(w.key()[0]))
+        self.assertTrue(nav.route(w, (1, 1)).startswith('RRR')) # out through C
+
+    def test_shortest(self):
+        w = world.read_world(['maps/contest1.map'])
+        self.assertEquals(nav.route(w, w.robot), '')
+        self.assertEquals(len(nav.route(w, (1, 2))), 5)
+        self.assertEquals(nav.route(w, w.lift), None) # still closed
+
+    def test_razors(self):
+        # the razor on the way is picked up, then one shave clears both beards
+        for lines, goal, expected in [(['#######', '#R!W\\L#', '#######'], (4, 1), 'RSRR'),
+                                      (['#L\\#', '##W#', '#RW#', '####', '', 'Razors 1'], (2, 3), 'SRUU')]:
+            w = world.parse_world(lines)
+            commands = nav.route(w, goal)
+            self.assertEquals(commands, expected)
+            for cmd in commands:
+                self.assertTrue(cmd in w.valid_moves())
+                w = w.move(cmd)
+            self.assertEquals(w.robot, goal)
+
+class TestTour(unittest.TestCase):
+    def test_exact(self):
+        rng = random.Random(0)
+        for n in xrange(1, 7):
+            matrix = [[rng.randint(1, 20) for _ in xrange(n + 1)] for _ in xrange(n + 1)]
+            to_lift = [rng.randint(1, 20) for _ in xrange(n + 1)]
+            best = min(tour.path_cost(matrix, to_lift, list(p))
+                       for p in itertools.permutations(range(1, n + 1)))
+            order = tour._exact(matrix, to_lift, n)
+            self.assertEquals(sorted(order), range(1, n + 1))
+            self.assertEquals(tour.path_cost(matrix, to_lift, order), best)
+            greedy = tour._nearest_neighbor(matrix, n)
+            improved = tour._improve(matrix, to_lift, greedy)
+            self.assertEquals(sorted(improved), range(1, n + 1))
+            self.assertTrue(tour.path_cost(matrix, to_lift, improved) <= tour.path_cost(matrix, to_lift, greedy))
+
+    def test_no_walk_over_every_stop(self):
+        # stops 1 and 2 can each be walked to, but not from each other
+        matrix = [[0, 3, 4, 5],
+                  [3, 0, tour.INFINITY, 2],
+                  [4, tour.INFINITY, 0, tour.INFINITY],
+                  [5, 2, tour.INFINITY, 0]]
+        to_lift = [0, 1, 1, 1]
+        order = tour._exact(matrix, to_lift, 3)
+        self.assertEquals(sorted(order), [1, 2, 3])
+
+    def test_follow(self):
+        w = world.read_world(['maps/contest1.map'])
+        plan = tour.plan(w)
+        self.assertEquals(sorted(plan.stops), sorted(w.lambdas))
+        for cmd in tour.follow(w, plan.stops):
+            w = w.move(cmd)
+        self.assertEquals(w.state, world.REACHED_LIFT)
+
+class TestBeards(unittest.TestCase):
+    def test_growth(self):
+        w = world.read_world(['maps/beard1.map'])
+        for _ in xrange(3 * w.beard_growth):
+            grows = w.beards_grow()
+            after = w.move(world.WAIT)
+            if grows:
+                self.assertTrue(w.beards < after.beards)
+                self.assertEquals(after.num_moves % w.beard_growth, 0)
+            else:
+                self.assertTrue(after.beards is w.beards)
+            w = after
+
+class TestRollout(unittest.TestCase):
+    def test_matches_world(self):
+        rng = random.Random(0)
+        r = rollout.Rollout()
+        for map_name in ['contest2', 'contest6', 'flood1', 'beard1']:
+            w = world.read_world(['maps/%s.map' % map_name])
+            r.reset(w)
+            for _ in xrange(200):
+                if w.is_done():
+                    break
+                n = r.valid_moves()
+                self.assertEquals(''.join(r.moves[:n]), w.valid_moves())
+                cmd = rng.choice(w.valid_moves().replace('A', ''))
+                x, y = w.robot
+                w = w.move(cmd)
+                r.step(cmd)
+                self.assertEquals(r.positions[r.length - 1], y * r.width + x)
+                self.assertEquals(str(r.cells), ''.join(''.join(row) for row in w.map))
+                self.assertEquals((r.score(), r.state), (w.score(), w.state))
+                self.assertEquals(sorted(r.rocks), sorted(y * r.width + x for x, y in w.rocks))
+                self.assertEquals(sorted(r.beards), sorted(y * r.width + x for x, y in w.beards))
+            self.assertEquals(r.commands(), str(w.path))
+
+class TestRave(unittest.TestCase):
+    def test_beta(self):
+        self.assertEquals(lifter_uct.rave_beta(0, 25), 1.0)
+        self.assertEquals(lifter_uct.rave_beta(25, 25), 0.5)
+        betas = [lifter_uct.rave_beta(n, 25) for n in [1, 10, 100, 1000, 10 ** 12]]
+        self.assertEquals(betas, sorted(betas, reverse=True))
+        self.assertTrue(betas[-1] < 1e-5)
+        ucb1 = lifter_uct.ucb1_formula(10, 50, 10 ** 12)
+        self.assertEquals(lifter_uct.rave_formula(10, 50, 10 ** 12, 0, 0, 25), ucb1)
+        self.assertAlmostEqual(lifter_uct.rave_formula(10, 50, 10 ** 12, 10, 1000, 25), ucb1, places=3)
+
+    def test_update(self):
+        w = world.parse_world(['#####', '#R  #', '#  \\#', '###L#'])
+        search = lifter_uct.UCTSearch(w, rave_k=25)
+        pool = search.pool
+        root = search.root
+        a = pool.add(root, 'R', w.move('R'), '')
+        d = pool.add(root, 'D', w.move('D'), '')
+        back = pool.world(a).move('L') # on the start cell again
+        b = pool.add(a, 'L', back, '')
+        c = pool.add(b, 'R', back.move('R'), '')
+        e = pool.add(b, 'D', back.move('D'), '')
+        search.playout.reset(back)
+        search.playout.step('D')
+        search.update_rave([root, a, b], ['R', 'L'], 10)
+        rave = search.rave
+        for n in [a, b, d, e]:
+            self.assertEquals(rave.stats(n), (1, 10.0))
+        # R from the start cell was only played before b
+        self.assertEquals(rave.stats(c), (0, 0.0))
+
+class TestParallelUCT(unittest.TestCase):
+    def run_workers(self, args):
+        opts, _ = lifter_uct.option_parser().parse_args(['--workers', '2', '--polish', '0'] + args)
+        opts.seed = ''
+        opts.solution_store = None
+        w = world.read_world(['maps/contest1.map'])
+        out = StringIO.StringIO()
+        stdout, sys.stdout = sys.stdout, out
+        try:
+            # contest1 is small enough for the workers to search it all
+            lifter_uct.main_parallel(w, opts)
+        finally:
+            sys.stdout = stdout
+        lines = out.getvalue().split()
+        reported = [int(lines[i + 2]) for i, word in enumerate(lines) if word == 'current']
+        for cmd in lines[-1]:
+            w = w.move(cmd)
+        self.assertEquals(w.score(), reported[-1])
+        self.assertEquals(reported[-1], 212)
+
+    def test_root_parallel(self):
+        self.run_workers([])
+
+    def test_tree_parallel(self):
+        self.run_workers(['--tree-parallel'])
+
+class TestGenetic(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_evolve(self):
+        opts, _ = lifter_genetic.option_parser().parse_args(
+            ['--time', '1', '--polish', '0', '--population', '10', '--children', '10'])
+        w = world.read_world(['maps/contest1.map'])
+        store = solutions.SolutionStore(self.directory)
+        out = StringIO.StringIO()
+        stdout, sys.stdout = sys.stdout, out
+        try:
+            lifter_genetic.evolve(w, ['LA'], opts, store)
+        finally:
+            sys.stdout = stdout
+        lines = out.getvalue().split()
+        reported = [int(lines[i + 2]) for i, word in enumerate(lines) if word == 'current']
+        self.assertEquals(replay.play(w, lines[-1]).score(), reported[-1])
+        self.assertEquals(store.get(w), (reported[-1], lines[-1]))
+
+class TestPolish(unittest.TestCase):
+    def play(self, w, commands):
+        for cmd in commands:
+            w = w.move(cmd)
+        return w
+
+    def test_detours(self):
+        w = world.read_world(['maps/contest1.map'])
+        commands, points = polish.polish(w, 'LDRWDDUULRLLLDWDL', time.time() + 5)
+        self.assertEquals(points, 4)
+        self.assertEquals(self.play(w, commands).score(), 212)
+
+    def test_abort_early(self):
+        w = world.read_world(['maps/contest1.map'])
+        commands, points = polish.polish(w, 'LDRDDUUWWLRA', time.time() + 5)
+        self.assertEquals(commands, 'LDRDDA')
+        self.assertEquals(points, 6)
+
+class TestPortfolio(unittest.TestCase):
+    def test_read(self):
+        w = world.read_world(['maps/contest1.map'])
+        race = portfolio.Race(w, [])
+        uct = portfolio.Entrant('uct')
+        race.read(uct, 'current best 24 LA\n')
+        self.assertEquals((race.best_score, race.best_commands), (-2, 'LA'))
+        race.read(uct, 'current best 500 UUUU\n')
+        self.assertEquals(race.best_score, -2)
+        race.read(portfolio.Entrant('tree'), 'best score 212 for [LDRDDUULLLDDL]\n')
+        self.assertEquals((race.best_score, race.best_commands), (212, 'LDRDDUULLLDDL'))
+        race.read(uct, 'LDRDDA\n')
+        self.assertEquals(race.best_score, 212)
+        self.assertRaises(ValueError, portfolio.Entrant, 'nobody@3')
+
+class TestReplayCache(unittest.TestCase):
+    def test_resume(self):
+        w = world.read_world(['maps/contest1.map'])
+        cache = replay.ReplayCache(w, interval=4)
+        end = cache.world('LDRDDUULLLDDL')
+        self.assertEquals(end.score(), 212)
+        self.assertEquals(cache.played, 13)
+        # the first 12 commands are checkpointed
+        self.assertEquals(cache.world('LDRDDUULLLDDL').score(), 212)
+        self.assertEquals(cache.played, 14)
+        self.assertEquals(cache.world('LDRDDUWA').score(), replay.play(w, 'LDRDDUWA').score())
+        self.assertEquals(cache.played, 18)
+        self.assertEquals(cache.world('LDRDDUULLLDDLW'), None)
+        self.assertEquals(cache.world('LDRDDUUR'), None)
+
+class TestService(unittest.TestCase):
+    def test_handle(self):
+        s = service.Service(polish_seconds=0)
+        with open('maps/contest1.map') as f:
+            text = f.read()
+        answer = json.loads(s.handle(json.dumps({'map': text, 'time': 1, 'searcher': 'nearbot', 'id': 3})))
+        self.assertEquals(answer['id'], 3)
+        self.assertEquals(answer['score'], 212)
+        self.assertEquals(replay.play(world.parse_world(text.splitlines()), answer['commands']).score(), 212)
+        self.assertTrue(s.world(text) is s.world(text))
+        answer = json.loads(s.handle(json.dumps({'map': text, 'searcher': 'nobody'})))
+        self.assertTrue('error' in answer)
+
+class TestSolutions(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.w = world.read_world(['maps/contest1.map'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_map_hash(self):
+        self.assertEquals(self.w.map_hash(), world.read_world(['maps/contest1.map']).map_hash())
+        self.assertNotEquals(self.w.map_hash(), world.read_world(['maps/contest2.map']).map_hash())
+
+    def test_round_trip(self):
+        store = solutions.SolutionStore(self.directory)
+        self.assertEquals(store.get(self.w), None)
+        self.assertTrue(store.put(self.w, 'LDRDDUULLLDDL', 212))
+        self.assertFalse(store.put(self.w, 'LA', 24))
+        self.assertEquals(solutions.SolutionStore(self.directory).get(self.w), (212, 'LDRDDUULLLDDL'))
+
+    def test_stale(self):
+        store = solutions.SolutionStore(self.directory)
+        store.put(self.w, 'LDRDDUULLLDDL', 212)
+        with open(store._path(self.w.map_hash()), 'w') as f:
+            json.dump({'score': 212, 'commands': 'UUUU'}, f)
+        self.assertEquals(solutions.SolutionStore(self.directory).get(self.w), None)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,199 @@
+"""Which order to pick up the lambdas in.
+
+Walking distances between the robot, the lambdas, the razors (on maps with
+beards) and the lift are worked out once, with one breadth first walk per
+stop over the map as it is.  The order is then a travelling salesman path
+from the robot through every stop, finishing at the lift: exact by dynamic
+programming over subsets for a handful of stops, otherwise nearest neighbor
+improved with 2-opt and Or-opt moves.  Trampolines make the distances one
+way, so candidate orders are always costed in full.
+"""
+import distances
+import nav
+import world
+
+EXACT_LIMIT = 12 # stops; the subset table grows as 2**n * n**2
+INFINITY = distances.INFINITY
+
+class Tour(object):
+    """An order to visit the stops of a world in
+
+    Instance Variables:
+    stops -- the (x, y) cells to visit, in order
+    cost -- the walking moves for the whole tour, lift included
+    unreachable -- stops there is no walk to, left out of the tour
+    """
+
+    def __init__(self, stops, cost, unreachable):
+        self.stops = stops
+        self.cost = cost
+        self.unreachable = unreachable
+
+def stops(w):
+    points = list(w.lambdas)
+    if w.beards:
+        points.extend(sorted(w.razors))
+    return points
+
+def distance_matrix(w, points):
+    """Get walking distances between points, and from each of them to the lift.
+
+    Returns (matrix, to_lift) where matrix[i][j] is the moves from
+    points[i] to points[j], INFINITY where there is no walk.
+    """
+    index = dict((p, i) for i, p in enumerate(points))
+    lx, ly = w.lift
+    lift_doors = set([(lx - 1, ly), (lx + 1, ly), (lx, ly - 1), (lx, ly + 1)])
+    matrix = []
+    to_lift = []
+    for p in points:
+        row = [INFINITY] * len(points)
+        lift = INFINITY
+        for d, q in distances.walk(w, p):
+            i = index.get(q)
+            if i is not None:
+                row[i] = d
+            if q in lift_doors:
+                lift = min(lift, d + 1)
+        matrix.append(row)
+        to_lift.append(lift)
+    return matrix, to_lift
+
+def path_cost(matrix, to_lift, order):
+    cost = 0
+    prev = 0
+    for i in order:
+        cost += matrix[prev][i]
+        prev = i
+    return cost + to_lift[prev]
+
+def _exact(matrix, to_lift, n):
+    # best[mask][i]: cheapest walk from the start (index 0) over the stops in
+    # mask, ending at stop i
+    full = (1 << n) - 1
+    best = [[INFINITY] * (n + 1) for _ in xrange(1 << n)]
+    back = [[None] * (n + 1) for _ in xrange(1 << n)]
+    for i in xrange(n):
+        best[1 << i][i + 1] = matrix[0][i + 1]
+    for mask in xrange(1, full + 1):
+        row = best[mask]
+        for i in xrange(1, n + 1):
+            c = row[i]
+            if c >= INFINITY:
+                continue
+            dist = matrix[i]
+            for j in xrange(n):
+                bit = 1 << j
+                if mask & bit:
+                    continue
+                nc = c + dist[j + 1]
+                if nc < best[mask | bit][j + 1]:
+                    best[mask | bit][j + 1] = nc
+                    back[mask | bit][j + 1] = i
+    last = min(xrange(1, n + 1), key=lambda i: best[full][i] + to_lift[i])
+    if best[full][last] + to_lift[last] >= INFINITY:
+        # one way trampolines leave no walk over every stop, and the back
+        # pointers would only give some of them
+        return _improve(matrix, to_lift, _nearest_neighbor(matrix, n))
+    order = []
+    mask = full
+    while last is not None:
+        order.append(last)
+        prev = back[mask][last]
+        mask &= ~(1 << (last - 1))
+        last = prev
+    order.reverse()
+    return order
+
+def _nearest_neighbor(matrix, n):
+    left = set(xrange(1, n + 1))
+    order = []
+    prev = 0
+    while left:
+        prev = min(left, key=lambda i: matrix[prev][i])
+        left.remove(prev)
+        order.append(prev)
+    return order
+
+def _improve(matrix, to_lift, order):
+    """2-opt and Or-opt moves until none of them helps"""
+    cost = path_cost(matrix, to_lift, order)
+    improved = True
+    while improved:
+        improved = False
+        n = len(order)
+        # 2-opt: reverse a stretch of the tour
+        for i in xrange(n - 1):
+            for j in xrange(i + 2, n + 1):
+                candidate = order[:i] + order[i:j][::-1] + order[j:]
+                c = path_cost(matrix, to_lift, candidate)
+                if c < cost:
+                    order, cost, improved = candidate, c, True
+        # Or-opt: move a stretch of up to three stops elsewhere
+        for length in (1, 2, 3):
+            for i in xrange(n - length + 1):
+                segment = order[i:i + length]
+                rest = order[:i] + order[i + length:]
+                for k in xrange(len(rest) + 1):
+                    if k == i:
+                        continue
+                    candidate = rest[:k] + segment + rest[k:]
+                    c = path_cost(matrix, to_lift, candidate)
+                    if c < cost:
+                        order, cost, improved = candidate, c, True
+                        break
+    return order
+
+def plan(w):
+    """Get a Tour of the stops of w"""
+    points = [w.robot] + stops(w)
+    matrix, to_lift = distance_matrix(w, points)
+    reachable = [i for i in xrange(1, len(points)) if matrix[0][i] < INFINITY]
+    unreachable = [points[i] for i in xrange(1, len(points)) if matrix[0][i] >= INFINITY]
+    if unreachable or any(to_lift[i] >= INFINITY for i in reachable):
+        # the lift won't open or can't be walked to, end wherever the last stop is
+        to_lift = [0] * len(points)
+    # renumber so the reachable stops are 1..n
+    keep = [0] + reachable
+    matrix = [[matrix[i][j] for j in keep] for i in keep]
+    to_lift = [to_lift[i] for i in keep]
+    n = len(reachable)
+    if n == 0:
+        order = []
+    elif n <= EXACT_LIMIT:
+        order = _exact(matrix, to_lift, n)
+    else:
+        order = _improve(matrix, to_lift, _nearest_neighbor(matrix, n))
+    return Tour([points[keep[i]] for i in order], path_cost(matrix, to_lift, order), unreachable)
+
+def follow(w, order):
+    """Walk w through the stops in order and then into the lift, with nav routes.
+
+    Each leg is routed on the world as the last one left it, and given up
+    where it would get the robot killed.  Returns the commands, ending with
+    an abort unless the robot got into the lift.
+    """
+    commands = []
+    for goal in list(order) + [w.lift]:
+        if w.is_done():
+            break
+        if goal == w.lift and w.lambdas:
+            break
+        if goal not in w.lambdas and goal not in w.razors and goal != w.lift:
+            continue # picked up on the way
+        leg = nav.route(w, goal)
+        if leg is None:
+            continue
+        for cmd in leg:
+            if cmd not in w.valid_moves():
+                break
+            after = w.move(cmd)
+            if after.is_failed():
+                break
+            w = after
+            commands.append(cmd)
+            if w.is_done():
+                break
+    if not w.is_done():
+        commands.append(world.ABORT)
+    return ''.join(commands)
@@ -1,3 +1,7 @@
+import collections
+import random
+import time
+
 def segments(xs, n):
     """Get a generic over the segments of a sequence
 
@@ -34,3 +38,192 @@ class Max(object):
             self.score = score
             self.key = key
 
+
+class LRUCache(object):
+    """A bounded mapping that evicts the least recently used key"""
+
+    def __init__(self, capacity):
+        assert capacity > 0
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        try:
+            val = self.entries.pop(key)
+        except KeyError:
+            return default
+        self.entries[key] = val
+        return val
+
+    def put(self, key, val):
+        self.entries.pop(key, None)
+        self.entries[key] = val
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def resize(self, capacity):
+        assert capacity > 0
+        self.capacity = capacity
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+class RandomSet(object):
+    """A set with O(1) add, remove and uniform random choice"""
+
+    def __init__(self):
+        self.items = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.index
+
+    def add(self, item):
+        if item not in self.index:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        i = self.index.pop(item, None)
+        if i is None:
+            return
+        # move the last item into the hole
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.index[last] = i
+
+    def choice(self):
+        return random.choice(self.items)
+
+class IndexedHeap(object):
+    """A max-heap of keys that can remove or reprioritize any key in O(log n)"""
+
+    def __init__(self):
+        self.heap = [] # list of (priority, key)
+        self.index = {} # maps key to its position in .heap
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def push(self, key, priority):
+        i = self.index.get(key)
+        if i is None:
+            i = len(self.heap)
+            self.heap.append((priority, key))
+            self.index[key] = i
+            self._sift_up(i)
+        else:
+            old = self.heap[i][0]
+            self.heap[i] = (priority, key)
+            if priority > old:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+
+    def peek(self):
+        return self.heap[0][1]
+
+    def pop(self):
+        key = self.heap[0][1]
+        self.discard(key)
+        return key
+
+    def discard(self, key):
+        i = self.index.pop(key, None)
+        if i is None:
+            return
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.index[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self.index[last[1]])
+
+    def _sift_up(self, i):
+        heap = self.heap
+        index = self.index
+        item = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[parent][0] >= item[0]:
+                break
+            heap[i] = heap[parent]
+            index[heap[i][1]] = i
+            i = parent
+        heap[i] = item
+        index[item[1]] = i
+
+    def _sift_down(self, i):
+        heap = self.heap
+        index = self.index
+        n = len(heap)
+        item = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1][0] > heap[child][0]:
+                child += 1
+            if heap[child][0] <= item[0]:
+                break
+            heap[i] = heap[child]
+            index[heap[i][1]] = i
+            i = child
+        heap[i] = item
+        index[item[1]] = i
+
+class PrefixCommitter(object):
+    """Decides when the leading commands of the best path have settled.
+
+    Offer every new best path to update().  Once the committed commands
+    plus the next .step commands of the best path have stayed the same for
+    .hold seconds, ready() returns them.  The searcher then tries to commit
+    to them and calls accept() if it could; until then ready() keeps
+    offering them, as long as the best path still starts with them.
+    """
+
+    def __init__(self, step, hold, clock=time.time):
+        assert step > 0
+        self.step = step
+        self.hold = hold
+        self.clock = clock
+        self.committed = ''
+        self.candidate = None
+        self.since = None
+
+    def update(self, commands):
+        commands = str(commands)
+        assert commands.startswith(self.committed)
+        candidate = commands[:len(self.committed) + self.step]
+        if len(candidate) < len(self.committed) + self.step:
+            candidate = None
+        if candidate != self.candidate:
+            self.candidate = candidate
+            self.since = self.clock()
+
+    def ready(self):
+        """Get the commands to commit to next, or None if they haven't settled"""
+        if self.candidate is None or self.clock() - self.since < self.hold:
+            return None
+        return self.candidate
+
+    def accept(self, commands):
+        """Commit to commands, as ready() gave them"""
+        assert commands == self.candidate
+        self.committed = commands
+        self.candidate = None
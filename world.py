@@ -9,6 +9,9 @@ import sys
 import urllib
 import urllib2
 
+import flood
+import paths
+
 log = logging.getLogger('world')
 
 # Map symbols
@@ -49,6 +52,8 @@ DEFAULT_RAZORS = 0
 DEFAULT_BEARD_GROWTH = 25
 
 all_dirs = [(-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0)]
+_DELTAS = {LEFT: (-1, 0), RIGHT: (1, 0), UP: (0, 1), DOWN: (0, -1)}
+_REVERSE = {LEFT: RIGHT, RIGHT: LEFT, UP: DOWN, DOWN: UP}
 
 class WorldEvent(Exception):
     pass
@@ -56,6 +61,18 @@ class WorldEvent(Exception):
 class InvalidMove(WorldEvent):
     pass
 
+class _MapCache(object):
+    """What is worked out once per map and shared by every copy of its world.
+
+    It is worked out from the world as read from the map, whichever copy
+    asks for it first.
+    """
+
+    def __init__(self, first):
+        self.first = first
+        self.distances = None
+        self.flood = None
+
 class World(object):
     """The world state
 
@@ -72,6 +89,12 @@ class World(object):
     waterproof -- the number of turns the robot may survive in water
     trampolines -- a mapping from a source (x, y) coordinate to a destination (x, y) coordinate where (x, y) is an offset from the bottom left, 0-indexed
     underwater -- the number of moves the robot has made while underwater
+    distances -- a distances.StaticDistances for the map, shared by copies
+    walking -- a distances.WalkingDistances, or None until one is asked for
+    frozen -- frozenset of rocks known to never move again, see frozen_rocks()
+    flood -- a flood.FloodTimeline for the map, shared by copies
+    beards -- frozenset of the (x, y) beard cells, shared by copies until they change
+    beard_growth -- beards grow every beard_growth moves, all at once, see beards_grow()
     """
     def __init__(self, map,
                  in_lift=False,
@@ -91,11 +114,14 @@ class World(object):
                  beards=None,
                  razors=None,
                  num_razors=None,
-                 beard_growth=None):
+                 beard_growth=None,
+                 walking=None,
+                 frozen=None,
+                 map_cache=None):
         self.in_lift = in_lift
         self.lambdas_collected = lambdas_collected
         self.map = map
-        self.path = path
+        self.path = paths.as_path(path)
         self.num_moves = num_moves
         self.state = state
         if water is None:
@@ -152,13 +178,22 @@ class World(object):
         self.beard_growth = beard_growth
 
         if beards is None:
-            beards = dict((p, self.beard_growth) for p, c in self.symbols() if c == BEARD)
+            beards = frozenset(p for p, c in self.symbols() if c == BEARD)
         self.beards = beards
 
         if num_razors is None:
             num_razors = DEFAULT_RAZORS
         self.num_razors = num_razors
 
+        self.walking = walking
+        self.frozen = frozen
+        self.map_cache = map_cache or _MapCache(self)
+        self._frozen_checked = False
+        self._upper_bound = None
+        self._dead = None
+        self._settled = None
+        self.quiet = False # the last move only moved the robot onto an empty cell
+
     def symbols(self):
         for p in self.positions():
             yield p, self.map[p[1]][p[0]]
@@ -210,18 +245,230 @@ class World(object):
 
         return (25*self.lambdas_collected*mult) - self.num_moves
 
+    def static_distances(self):
+        import distances # distances needs the symbols above
+        cache = self.map_cache
+        if cache.distances is None:
+            cache.distances = distances.StaticDistances(cache.first)
+        return cache.distances
+
+    def flood_timeline(self):
+        cache = self.map_cache
+        if cache.flood is None:
+            cache.flood = flood.FloodTimeline(cache.first)
+        return cache.flood
+
+    def walking_distances(self):
+        import distances
+        if self.walking is None:
+            self.walking = distances.WalkingDistances(self.trampolines)
+        return self.walking
+
+    def lift_distance(self, pos=None):
+        """Get the moves to walk from pos (the robot by default) to the lift, or None"""
+        return self.walking_distances().field(self, 'lift').distance(pos or self.robot)
+
+    def lambda_distance(self, pos=None):
+        """Get the moves to walk from pos (the robot by default) to the nearest lambda, or None"""
+        return self.walking_distances().field(self, 'lambdas').distance(pos or self.robot)
+
+    def walking_distance(self, goal, pos=None):
+        """Get the moves to walk from pos (the robot by default) to the cell goal, or None"""
+        return self.walking_distances().field(self, tuple(goal)).distance(pos or self.robot)
+
+    def nearest_lambda(self):
+        """Get (position, moves) of the lambda nearest to the robot, or (None, None)"""
+        field = self.walking_distances().field(self, 'lambdas')
+        d = field.distance(self.robot)
+        if d is None:
+            return None, None
+        width = field.width
+        u = self.robot[1] * width + self.robot[0]
+        while field.dist[u] > 0:
+            for v in field.successors(self, u):
+                if field.dist[v] == field.dist[u] - 1:
+                    u = v
+                    break
+        return (u % width, u // width), d
+
+    def frozen_rocks(self):
+        """Get the rocks that can never move again, as a frozenset of (x, y)"""
+        if not self._frozen_checked:
+            # rocks frozen before the last move are still frozen
+            self.frozen = self.static_distances().frozen(self, self.frozen or ())
+            self._frozen_checked = True
+        return self.frozen
+
+    def is_dead(self):
+        """Check whether the robot can no longer get every lambda and leave.
+
+        Frozen rocks count as walls.  A finished world is never dead.
+        """
+        self.upper_bound()
+        return self._dead
+
+    def upper_bound(self):
+        """Get a score that no world reachable from this one can beat.
+
+        Lambdas the robot can never walk to, or only after the water
+        got there, don't count, and the moves still needed are bounded
+        with static distances that ignore every rock that may still move.
+        A dead world can only abort.
+        """
+        if self._upper_bound is not None:
+            return self._upper_bound
+        if self.is_done():
+            self._upper_bound = self.score()
+            self._dead = False
+            return self._upper_bound
+        import distances
+        dist = self.static_distances().blocked_by(self.frozen_rocks())
+        lift_field = dist.field(self.lift)
+        width = dist.width
+        timeline = self.flood_timeline()
+        doom = timeline.doom(self)
+        reachable = 0
+        nearest = None
+        farthest = 0 # most moves to the lift through any one lambda
+        can_lift = True
+        for l in self.lambdas:
+            d = dist.distance(self.robot, l)
+            if d == distances.UNREACHABLE or not timeline.reachable(l, self.num_moves + d, doom):
+                can_lift = False
+                continue
+            if not timeline.survivable(l, self.num_moves + d, doom):
+                can_lift = False
+            reachable += 1
+            if nearest is None or d < nearest:
+                nearest = d
+            to_lift = lift_field[l[1] * width + l[0]]
+            if to_lift == distances.UNREACHABLE:
+                can_lift = False
+            else:
+                farthest = max(farthest, d + to_lift)
+
+        collected = self.lambdas_collected
+        # abort right away, or after picking up every reachable lambda
+        bound = 50*collected - self.num_moves
+        if reachable:
+            bound = max(bound, 50*(collected + reachable) - self.num_moves - (nearest + reachable - 1))
+        # or get everything and leave through the lift
+        if can_lift:
+            if reachable:
+                lift_moves = max(farthest, nearest + reachable)
+            else:
+                lift_moves = dist.distance(self.robot, self.lift)
+            if lift_moves == distances.UNREACHABLE or \
+                    not timeline.survivable(self.lift, self.num_moves + lift_moves, doom):
+                can_lift = False
+            else:
+                bound = max(bound, 75*(collected + reachable) - self.num_moves - lift_moves)
+        self._upper_bound = bound
+        self._dead = not can_lift
+        return bound
+
     def goodness(self, extra_moves=0, force_abort=False):
         """How good is the score for this world, considering how many moves it
         took to get to this state?
         """
         return float(self.score() - extra_moves)**2 / float(self.num_moves or 1)
 
+    def is_settled(self):
+        """Check whether waiting would change nothing but the move count.
+
+        No rock can fall or slide, there are no beards, the water doesn't
+        rise and the lift isn't about to open.
+        """
+        if self._settled is None:
+            self._settled = (not self.is_done() and self.flooding == 0 and
+                             not self.beards and not self._lift_opening() and
+                             not any(self._rock_can_move(x, y) for x, y in self.rocks))
+        return self._settled
+
+    def _lift_opening(self):
+        x, y = self.lift
+        return self.map[y][x] == CLOSED and self.remaining_lambdas == 0
+
+    def _rock_can_move(self, x, y, changes=None):
+        """Check whether the rock at (x, y) would move in the next update.
+
+        changes -- maps (x, y) to the symbols to read there instead of the map's
+        """
+        w, h = self.size()
+        def at(cx, cy):
+            if changes and (cx, cy) in changes:
+                return changes[cx, cy]
+            if cx < 0 or cy < 0 or cx >= w or cy >= h:
+                return WALL
+            return self.map[cy][cx]
+        below = at(x, y - 1)
+        if below == EMPTY:
+            return True
+        if below in (ROCK, LAMBDA) and at(x + 1, y) == EMPTY and at(x + 1, y - 1) == EMPTY:
+            return True
+        return below == ROCK and at(x - 1, y) == EMPTY and at(x - 1, y - 1) == EMPTY
+
+    def _rocks_near(self, cells, changes=None):
+        """Check whether a change at any of cells may set off a rock"""
+        for cx, cy in cells:
+            for dx in (-1, 0, 1):
+                for dy in (0, 1):
+                    x = cx + dx
+                    y = cy + dy
+                    if changes and (x, y) in changes:
+                        sym = changes[x, y]
+                    elif 0 <= x < self.width() and 0 <= y < self.height():
+                        sym = self.map[y][x]
+                    else:
+                        continue
+                    if sym == ROCK and self._rock_can_move(x, y, changes):
+                        return True
+        return False
+
+    def useful_moves(self):
+        """Get the valid moves, as a string, without the ones that can't help.
+
+        In a settled world waiting only costs a move, and so does undoing a
+        step that moved nothing but the robot, unless stepping back lets a
+        rock go.
+        """
+        moves = self.valid_moves()
+        if not moves or not self.is_settled():
+            return moves
+        moves = moves.replace(WAIT, '')
+        back = _REVERSE.get(self.path.last())
+        if self.quiet and back in moves:
+            dx, dy = _DELTAS[back]
+            x, y = self.robot
+            prev = (x + dx, y + dy)
+            changes = {self.robot: EMPTY, prev: ROBOT}
+            if not self._rocks_near([self.robot, prev], changes):
+                moves = moves.replace(back, '')
+        return moves
+
+    def map_hash(self):
+        """Hash the map and its metadata, to tell maps apart between runs.
+
+        Only meaningful for a world as read from its map file.
+        """
+        lines = [''.join(row).rstrip() for row in reversed(self.map)]
+        lines.append('water %d flooding %d waterproof %d growth %d razors %d' % (
+            self.water, self.flooding, self.waterproof, self.beard_growth, self.num_razors))
+        for src, dst in sorted(self.trampolines.iteritems()):
+            lines.append('trampoline %d,%d %d,%d' % (src + dst))
+        return hashlib.sha1('\n'.join(lines)).hexdigest()
+
     def size(self):
         """Get a tuple of the width and the height of the map"""
         return len(self.map[0]), len(self.map)
 
     def key(self):
-        return repr((self.map, self.flood_level))
+        """A hashable key for the state of the world, whatever path led here.
+
+        The move count is left out, compare num_moves separately.
+        """
+        return (''.join(''.join(row) for row in self.map),
+                self.water, self.underwater, self.num_razors, self.state)
 
     def copy(self):
         """Make a copy of the World object."""
@@ -244,7 +491,10 @@ class World(object):
                       beard_growth=self.beard_growth,
                       num_razors=self.num_razors,
                       razors=self.razors.copy(),
-                      beards=self.beards.copy())
+                      beards=self.beards,
+                      walking=self.walking,
+                      frozen=self.frozen,
+                      map_cache=self.map_cache)
         #other.check_rocks()
         #print '%d copied to %d' % (id(self), id(other))
         return other
@@ -343,10 +593,12 @@ class World(object):
         elif direction == ABORT:
             pass
         elif direction == SHAVE and self.num_razors > 0:
-            for bx, by in self.beards.keys():
+            shaved = set()
+            for bx, by in self.beards:
                 if abs(bx - orig_x) <= 1 and abs(by - orig_y) <= 1:
                     self.map[by][bx] = EMPTY
-                    del self.beards[bx, by]
+                    shaved.add((bx, by))
+            self.beards = self.beards - shaved
             self.num_razors -= 1
 
         robot_x += dx
@@ -380,9 +632,11 @@ class World(object):
             raise InvalidMove("unexpected target")
         elif symbol in TRAMPOLINES:
             target_pos = self.trampolines[robot_x, robot_y]
-            # Remove the trampoline target and destination
-            self.trampolines = dict((k, v) for (k, v) in self.trampolines.items() if v != target_pos and k != (robot_x, robot_y))
-            self.map[robot_y][robot_x] = EMPTY
+            # Remove the target and every trampoline leading there, not just this one
+            for (tx, ty), v in self.trampolines.iteritems():
+                if v == target_pos:
+                    self.map[ty][tx] = EMPTY
+            self.trampolines = dict((k, v) for (k, v) in self.trampolines.items() if v != target_pos)
             robot_x, robot_y = target_pos
         elif symbol == RAZOR:
             self.num_razors += 1
@@ -417,6 +671,16 @@ class World(object):
         #world.check_rocks()
         world.num_moves += 1
         world.path += direction
+        rocks_still = world.rocks == self.rocks
+        world.quiet = (rocks_still and direction in _DELTAS and world.robot != self.robot and
+                       self.map[world.robot[1]][world.robot[0]] == EMPTY and
+                       world.beards is self.beards)
+        if self._settled and rocks_still and world.trampolines is self.trampolines:
+            # only the cells the robot left and entered changed
+            world._settled = (not world.is_done() and not world._lift_opening() and
+                              not world._rocks_near([self.robot, world.robot]))
+        if self.walking is not None:
+            world.walking = self.walking.after_move(self, world)
         #self.check_rocks()
         #world.check_rocks()
         return world
@@ -426,67 +690,65 @@ class World(object):
         input_map = input_map or self.map
         return map(list, input_map)
 
+    def beards_grow(self):
+        """Check whether the beards grow in the update after the next move.
+
+        Every beard starts its countdown with the map and they all grow
+        together, so one clock derived from num_moves covers them all.
+        """
+        return self.beard_growth <= 1 or (self.num_moves + 1) % self.beard_growth == 0
+
     def _update_world(self, read_map, moved_rocks):
         """Update the world by moving rocks, opening lifts, etc."""
         write_map = self.copy_map(read_map)
         rock_removals = []
         rock_additions = []
-        points = []
-        points.extend((y, x, ROCK) for x, y in self.rocks)
-        points.extend((y, x, BEARD) for x, y in self.beards)
-        points.sort()
-        w, h = self.size()
-        for y, x, check_sym in points:
-            if check_sym == BEARD:
-                growth_state = self.beards[x, y]
-                if growth_state <= 1:
-                    # for each nearby cell, apply growth
-                    for dx, dy in all_dirs:
-                       bx = x + dx
-                       by = y + dy
-                       if bx < 0 or by < 0 or bx >= w or by >= h:
-                           continue
-                       if read_map[by][bx] == EMPTY and write_map[by][bx] == EMPTY:
-                           write_map[by][bx] = BEARD
-                           self.beards[bx, by] = self.beard_growth
-                    new_growth_state = self.beard_growth
-                else:
-                    new_growth_state = growth_state - 1
-                self.beards[x, y] = new_growth_state
-            elif check_sym == ROCK:
-                below = read_map[y - 1][x]
-                left = read_map[y][x - 1]
-                right = read_map[y][x + 1]
-                rdiag = read_map[y - 1][x + 1]
-                ldiag = read_map[y - 1][x - 1]
-                if below == EMPTY:
-                    rock_removals.append((x, y))
-                    rock_additions.append((x, y - 1))
-                    write_map[y - 1][x] = ROCK
-                    write_map[y][x] = EMPTY
-                    moved_rocks.add((x, y - 1))
-                # FIXME: what if robot below rock
-                elif below == ROCK and right == EMPTY and rdiag == EMPTY:
-                    rock_removals.append((x, y))
-                    rock_additions.append((x + 1, y - 1))
-                    write_map[y][x] = EMPTY
-                    write_map[y - 1][x + 1] = ROCK
-                    moved_rocks.add((x + 1, y - 1))
-                elif below == ROCK and (right != EMPTY or rdiag != EMPTY) and left == EMPTY and ldiag == EMPTY:
-                    rock_removals.append((x, y))
-                    rock_additions.append((x - 1, y - 1))
-                    write_map[y][x] = EMPTY
-                    write_map[y - 1][x - 1] = ROCK
-                    moved_rocks.add((x - 1, y - 1))
-                elif below == LAMBDA and right == EMPTY and rdiag == EMPTY:
-                    rock_removals.append((x, y))
-                    rock_additions.append((x + 1, y - 1))
-                    write_map[y][x] = EMPTY
-                    write_map[y - 1][x + 1] = ROCK
-                    moved_rocks.add((x + 1, y - 1))
-        for x, y in self.beards.keys():
-            if write_map[y][x] != BEARD:
-                del self.beards[x, y]
+        for x, y in self.rocks:
+            below = read_map[y - 1][x]
+            left = read_map[y][x - 1]
+            right = read_map[y][x + 1]
+            rdiag = read_map[y - 1][x + 1]
+            ldiag = read_map[y - 1][x - 1]
+            if below == EMPTY:
+                rock_removals.append((x, y))
+                rock_additions.append((x, y - 1))
+                write_map[y - 1][x] = ROCK
+                write_map[y][x] = EMPTY
+                moved_rocks.add((x, y - 1))
+            # FIXME: what if robot below rock
+            elif below == ROCK and right == EMPTY and rdiag == EMPTY:
+                rock_removals.append((x, y))
+                rock_additions.append((x + 1, y - 1))
+                write_map[y][x] = EMPTY
+                write_map[y - 1][x + 1] = ROCK
+                moved_rocks.add((x + 1, y - 1))
+            elif below == ROCK and (right != EMPTY or rdiag != EMPTY) and left == EMPTY and ldiag == EMPTY:
+                rock_removals.append((x, y))
+                rock_additions.append((x - 1, y - 1))
+                write_map[y][x] = EMPTY
+                write_map[y - 1][x - 1] = ROCK
+                moved_rocks.add((x - 1, y - 1))
+            elif below == LAMBDA and right == EMPTY and rdiag == EMPTY:
+                rock_removals.append((x, y))
+                rock_additions.append((x + 1, y - 1))
+                write_map[y][x] = EMPTY
+                write_map[y - 1][x + 1] = ROCK
+                moved_rocks.add((x + 1, y - 1))
+        if self.beards and self.beards_grow():
+            # grow into every empty neighbor at once; a rock falling into a
+            # cell takes it before the beard does
+            w, h = self.size()
+            grown = set()
+            for x, y in self.beards:
+                for dx, dy in all_dirs:
+                    grown.add((x + dx, y + dy))
+            grown = [(bx, by) for bx, by in grown
+                     if 0 <= bx < w and 0 <= by < h and
+                     read_map[by][bx] == EMPTY and write_map[by][bx] == EMPTY]
+            if grown:
+                for bx, by in grown:
+                    write_map[by][bx] = BEARD
+                self.beards = self.beards.union(grown)
         removals = set(rock_removals) - set(rock_additions)
         self.rocks = sorted(((set(self.rocks) | set(rock_additions)) - removals),
                             key=lambda r: (r[1], r[0]))
@@ -541,7 +803,7 @@ class World(object):
         return type(self) == type(other) and self.path == other.path and self.map == other.map
 
     def __str__(self):
-        buf = ['~~~ %s' % self.path]
+        buf = ['~~~ %s' % (self.path,)]
         for row in reversed(self.map):
             buf.append(''.join(row))
         buf[-1] += ' %d lambdas left' % (self.remaining_lambdas,)
@@ -560,6 +822,10 @@ _tramp_pat = re.compile(r"^Trampoline ([A-Za-z]) targets (\d+)$")
 
 def read_world(files):
     """Read a world state from a sequence of files or stdin"""
+    return parse_world(fileinput.input(files))
+
+def parse_world(lines):
+    """Make a world from the lines of a map"""
     width = 0
     height = 0
     a_map = []
@@ -571,7 +837,7 @@ def read_world(files):
     trampoline_keys = {}
     beard_growth = None
     num_razors = None
-    for row, line in enumerate(fileinput.input(files)):
+    for row, line in enumerate(lines):
         line = line.rstrip('\r\n')
         if line == '':
             ext = True
@@ -586,6 +852,7 @@ def read_world(files):
                 if char == LAMBDA:
                     lambdas += 1
         else:
+            line = line.strip() # some maps have trailing spaces after the metadata
             match = _ext_pat.match(line)
             tramp_match = _tramp_pat.match(line)
             if tramp_match: